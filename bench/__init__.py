@@ -0,0 +1,5 @@
+"""Benchmarks and load tools, run from the repository root as ``python -m bench.<name>``."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
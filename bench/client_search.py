@@ -0,0 +1,74 @@
+"""Latency of ``client_search`` queries over a synthetic client base.
+
+    python -m bench.client_search [--clients N] [--queries N] [--seed N]
+"""
+import argparse
+import json
+import random
+import time
+
+from client_search import ClientSearchIndex
+
+LAST_NAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Фёдоров",
+    "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев",
+    "Орлов", "Андреев", "Макаров", "Никитин", "Захаров", "Зайцев", "Соловьёв", "Борисов", "Яковлев", "Григорьев",
+]
+FIRST_NAMES = ["Александр", "Сергей", "Дмитрий", "Андрей", "Алексей", "Максим", "Евгений", "Иван", "Михаил", "Артём"]
+MIDDLE_NAMES = ["Александрович", "Сергеевич", "Дмитриевич", "Андреевич", "Иванович", "Петрович", None]
+
+
+def clients(count: int, rng: random.Random):
+    for client_id in range(1, count + 1):
+        # Suffixes keep surnames from collapsing onto 30 values.
+        last = rng.choice(LAST_NAMES) + rng.choice(["", "", "ский", "ин", "ченко"])
+        yield client_id, last, rng.choice(FIRST_NAMES), rng.choice(MIDDLE_NAMES), f"+7 9{rng.randrange(10**9):09d}"
+
+
+def typo(word: str, rng: random.Random) -> str:
+    position = rng.randrange(1, len(word))
+    return word[:position] + word[position + 1:]
+
+
+def percentile(samples, share: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    index = ClientSearchIndex()
+    rows = list(clients(args.clients, rng))
+    started = time.perf_counter()
+    index.replace(rows)
+    build_seconds = time.perf_counter() - started
+
+    kinds = {
+        "surname_typo": lambda row: typo(row[1], rng),
+        "surname_and_name": lambda row: f"{row[1]} {row[2][:3]}",
+        "phone_suffix": lambda row: row[4][-4:],
+    }
+    report = {"clients": args.clients, "build_seconds": round(build_seconds, 2), "queries": {}}
+    for kind, make in kinds.items():
+        samples = []
+        for _ in range(args.queries):
+            query = make(rng.choice(rows))
+            started = time.perf_counter()
+            index.search(query, 20)
+            samples.append((time.perf_counter() - started) * 1000)
+        report["queries"][kind] = {
+            "p50_ms": round(percentile(samples, 0.50), 3),
+            "p95_ms": round(percentile(samples, 0.95), 3),
+            "p99_ms": round(percentile(samples, 0.99), 3),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Check that every filtered list query is served by an index, not a full table scan.
+
+    python -m bench.seed --db igora-bench.db --scale 0.01
+    python -m bench.explain --db igora-bench.db
+
+Runs EXPLAIN QUERY PLAN on SQLite for each filter of GET /orders/,
+/equipment/ and /clients/ (alone, combined and with each sort key) and exits
+with status 1 if any plan scans Orders, Equipment or Clients.
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy.dialects import sqlite
+
+import crud
+from bench.seed import BASE_DATE, DEFAULT_DB
+
+SINCE = datetime(2025, 11, 1)
+
+# (name, table, statement builder)
+CASES: List[Tuple[str, str, Callable]] = [
+    ("orders status", "Orders", lambda: crud.orders_query(status="active")),
+    ("orders status by date", "Orders", lambda: crud.orders_query(status="active", sort="order_date")),
+    ("orders client", "Orders", lambda: crud.orders_query(client_id=42)),
+    ("orders client by date", "Orders", lambda: crud.orders_query(client_id=42, sort="order_date")),
+    ("orders client in range", "Orders", lambda: crud.orders_query(client_id=42, date_from=SINCE, date_to=BASE_DATE)),
+    ("orders user", "Orders", lambda: crud.orders_query(user_id=7)),
+    ("orders user in range", "Orders", lambda: crud.orders_query(user_id=7, date_from=SINCE, date_to=BASE_DATE)),
+    ("orders range", "Orders", lambda: crud.orders_query(date_from=SINCE, date_to=BASE_DATE)),
+    ("orders range by date", "Orders", lambda: crud.orders_query(date_from=SINCE, date_to=BASE_DATE, sort="order_date")),
+    ("orders since", "Orders", lambda: crud.orders_query(date_from=SINCE, sort="order_date")),
+    ("orders status in range", "Orders", lambda: crud.orders_query(status="completed", date_from=SINCE, date_to=BASE_DATE)),
+    ("equipment category", "Equipment", lambda: crud.equipment_query(category_id=3)),
+    ("equipment category by category", "Equipment", lambda: crud.equipment_query(category_id=3, sort="category_id")),
+    ("equipment available", "Equipment", lambda: crud.equipment_query(is_available=True)),
+    ("equipment condition", "Equipment", lambda: crud.equipment_query(condition_status="needs_repair")),
+    ("equipment size", "Equipment", lambda: crud.equipment_query(size="42")),
+    ("equipment category, size, available", "Equipment", lambda: crud.equipment_query(category_id=3, size="42", is_available=True)),
+    ("clients last name", "Clients", lambda: crud.clients_query(last_name="Иванов")),
+    ("clients last name by name", "Clients", lambda: crud.clients_query(last_name="Иванов", sort="last_name")),
+    ("clients phone", "Clients", lambda: crud.clients_query(phone="+7 9001234567")),
+    ("clients email", "Clients", lambda: crud.clients_query(email="client1@example.com")),
+]
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def full_scans(plan: List[str], table: str) -> List[str]:
+    # "SCAN Orders" and "SCAN Orders USING INDEX ..." both read the whole table;
+    # only "SEARCH Orders USING ..." seeks into an index.
+    return [detail for detail in plan if detail.startswith(f"SCAN {table}")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+    connection = sqlite3.connect(args.db)
+    failures = 0
+    try:
+        for name, table, build in CASES:
+            sql = compile_sql(build())
+            plan = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + sql)]
+            scans = full_scans(plan, table)
+            failures += bool(scans)
+            print(f"{'FULL SCAN' if scans else 'ok':9}  {name}")
+            if scans or args.verbose:
+                for detail in plan:
+                    print(f"           {detail}")
+    finally:
+        connection.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
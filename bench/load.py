@@ -0,0 +1,320 @@
+"""Drive every route of the app in-process and report latency per endpoint as JSON.
+
+    python -m bench.seed --db igora-bench.db
+    python -m bench.load --db igora-bench.db [--requests 200] [--concurrency 8] [--out result.json]
+
+Run ``bench.seed`` again before each run that includes writes, so every commit
+is measured against the same data.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from config import get_settings
+from bench.seed import BASE_DATE, BENCH_PASSWORD, DEFAULT_DB
+
+PAGE = 50
+
+
+@dataclass
+class Context:
+    """What the scenarios need to know about the seeded data."""
+
+    max_ids: Dict[str, int]
+    order_barcodes: List[str]
+    active_lines: List[tuple]
+    session_ids: List[str] = field(default_factory=list)
+    unique: Any = field(default_factory=itertools.count)
+
+    def id(self, rng: random.Random, table: str) -> int:
+        return rng.randrange(1, self.max_ids[table] + 1)
+
+
+def inspect(path: str) -> Context:
+    connection = sqlite3.connect(path)
+    try:
+        tables = {
+            "Roles": "role_id", "Users": "user_id", "Clients": "client_id", "Equipment_Categories": "category_id",
+            "Equipment": "equipment_id", "Services": "service_id", "Orders": "order_id",
+            "Consumables": "consumable_id",
+        }
+        max_ids = {table: connection.execute(f"SELECT MAX({pk}) FROM {table}").fetchone()[0] or 1 for table, pk in tables.items()}
+        barcodes = [row[0] for row in connection.execute("SELECT barcode FROM Orders ORDER BY order_id DESC LIMIT 1000")]
+        active_lines = connection.execute(
+            "SELECT o.order_id, s.equipment_id FROM Orders o JOIN Order_Services s ON s.order_id = o.order_id"
+            " WHERE o.status = 'active' AND s.equipment_id IS NOT NULL"
+        ).fetchall()
+    finally:
+        connection.close()
+    return Context(max_ids, barcodes, active_lines)
+
+
+def window(rng: random.Random, days: int) -> Dict[str, str]:
+    end = BASE_DATE.date() - timedelta(days=rng.randrange(0, 365))
+    return {"date_from": (end - timedelta(days=days)).isoformat(), "date_to": end.isoformat()}
+
+
+def order_body(ctx: Context, rng: random.Random) -> dict:
+    start = BASE_DATE + timedelta(days=rng.randrange(1, 60), hours=rng.randrange(8))
+    return {
+        "client_id": ctx.id(rng, "Clients"),
+        "user_id": ctx.id(rng, "Users"),
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(hours=rng.choice([2, 4, 8]))).isoformat(),
+    }
+
+
+def client_body(ctx: Context, rng: random.Random) -> dict:
+    n = next(ctx.unique)
+    return {"client_code": f"B{os.getpid()}-{n}", "first_name": "Бенч", "last_name": f"Нагрузкин{n}", "phone": f"+7 900 {n:07d}"}
+
+
+def equipment_body(ctx: Context, rng: random.Random) -> dict:
+    return {"category_id": ctx.id(rng, "Equipment_Categories"), "brand": "Bench", "size": "42"}
+
+
+def transaction_body(ctx: Context, rng: random.Random) -> dict:
+    return {"consumable_id": ctx.id(rng, "Consumables"), "user_id": ctx.id(rng, "Users"), "transaction_type": "receipt", "quantity": "1"}
+
+
+def bearer(ctx: Context, rng: random.Random) -> dict:
+    return {"Authorization": f"Bearer {rng.choice(ctx.session_ids)}"}
+
+
+# (method, route path) -> build(ctx, rng) returning httpx.request keyword arguments.
+SCENARIOS: Dict[tuple, Callable[[Context, random.Random], dict]] = {
+    ("GET", "/"): lambda ctx, rng: {"url": "/"},
+    ("GET", "/auth/me"): lambda ctx, rng: {"url": "/auth/me", "headers": bearer(ctx, rng)},
+    ("GET", "/roles/"): lambda ctx, rng: {"url": "/roles/"},
+    ("GET", "/roles/{role_id}"): lambda ctx, rng: {"url": f"/roles/{ctx.id(rng, 'Roles')}"},
+    ("GET", "/users/"): lambda ctx, rng: {"url": "/users/", "params": {"limit": PAGE}},
+    ("GET", "/users/{user_id}"): lambda ctx, rng: {"url": f"/users/{ctx.id(rng, 'Users')}"},
+    ("GET", "/clients/"): lambda ctx, rng: {"url": "/clients/", "params": {"limit": PAGE, "skip": rng.randrange(1000)}},
+    ("GET", "/clients/search"): lambda ctx, rng: {
+        "url": "/clients/search", "params": {"q": rng.choice(["Иванов", "Петров Ал", "Смирнв", "4567", "client12"])},
+    },
+    ("GET", "/clients/{client_id}"): lambda ctx, rng: {"url": f"/clients/{ctx.id(rng, 'Clients')}"},
+    ("GET", "/equipment-categories/"): lambda ctx, rng: {"url": "/equipment-categories/"},
+    ("GET", "/equipment-categories/{category_id}"): lambda ctx, rng: {
+        "url": f"/equipment-categories/{ctx.id(rng, 'Equipment_Categories')}",
+    },
+    ("GET", "/equipment/"): lambda ctx, rng: {"url": "/equipment/", "params": {"limit": PAGE, "skip": rng.randrange(1000)}},
+    ("GET", "/equipment/availability"): lambda ctx, rng: {
+        "url": "/equipment/availability",
+        "params": {
+            "category_id": ctx.id(rng, "Equipment_Categories"),
+            "from": (BASE_DATE + timedelta(hours=rng.randrange(48))).isoformat(),
+            "to": (BASE_DATE + timedelta(hours=rng.randrange(49, 96))).isoformat(),
+            "limit": PAGE,
+        },
+    },
+    ("GET", "/equipment/{equipment_id}"): lambda ctx, rng: {"url": f"/equipment/{ctx.id(rng, 'Equipment')}"},
+    ("GET", "/services/"): lambda ctx, rng: {"url": "/services/"},
+    ("GET", "/services/{service_id}"): lambda ctx, rng: {"url": f"/services/{ctx.id(rng, 'Services')}"},
+    ("GET", "/orders/"): lambda ctx, rng: {
+        "url": "/orders/", "params": {"limit": PAGE, "sort": "order_date", "expand": rng.choice(["", "client", "lines"])},
+    },
+    ("GET", "/orders/{order_id}"): lambda ctx, rng: {
+        "url": f"/orders/{ctx.id(rng, 'Orders')}", "params": {"expand": "client,user,lines.service,lines.equipment"},
+    },
+    ("GET", "/scan/{barcode}"): lambda ctx, rng: {
+        "url": "/scan/" + (rng.choice(ctx.order_barcodes) if rng.random() < 0.5 else f"EQ{ctx.id(rng, 'Equipment'):08d}"),
+    },
+    ("GET", "/consumables/"): lambda ctx, rng: {"url": "/consumables/"},
+    ("GET", "/consumables/low-stock"): lambda ctx, rng: {"url": "/consumables/low-stock"},
+    ("GET", "/consumables/{consumable_id}"): lambda ctx, rng: {"url": f"/consumables/{ctx.id(rng, 'Consumables')}"},
+    ("GET", "/consumable-transactions/"): lambda ctx, rng: {
+        "url": "/consumable-transactions/", "params": {"limit": PAGE, "sort": "transaction_date"},
+    },
+    ("GET", "/reports/daily-statistics"): lambda ctx, rng: {"url": "/reports/daily-statistics", "params": window(rng, 30)},
+    ("GET", "/reports/popular-services"): lambda ctx, rng: {"url": "/reports/popular-services", "params": window(rng, 30)},
+    ("GET", "/export/orders"): lambda ctx, rng: {"url": "/export/orders", "params": {**window(rng, 3), "format": "ndjson"}},
+    ("GET", "/export/consumable-transactions"): lambda ctx, rng: {
+        "url": "/export/consumable-transactions", "params": {**window(rng, 30), "format": "csv"},
+    },
+    ("POST", "/auth/login"): lambda ctx, rng: {
+        "url": "/auth/login", "json": {"login": f"user{ctx.id(rng, 'Users')}", "password": BENCH_PASSWORD},
+    },
+    ("POST", "/auth/logout"): lambda ctx, rng: {
+        "url": "/auth/logout", "headers": {"Authorization": f"Bearer {ctx.session_ids.pop()}"} if ctx.session_ids else {},
+    },
+    ("POST", "/roles/"): lambda ctx, rng: {"url": "/roles/", "json": {"role_name": f"bench-{os.getpid()}-{next(ctx.unique)}"}},
+    ("POST", "/users/"): lambda ctx, rng: {
+        "url": "/users/",
+        "json": {"login": f"bench{os.getpid()}-{next(ctx.unique)}", "first_name": "Б", "last_name": "Б", "role_id": 1, "password": "x"},
+    },
+    ("POST", "/clients/"): lambda ctx, rng: {"url": "/clients/", "json": client_body(ctx, rng)},
+    ("POST", "/clients/bulk"): lambda ctx, rng: {"url": "/clients/bulk", "json": [client_body(ctx, rng) for _ in range(20)]},
+    ("POST", "/equipment-categories/"): lambda ctx, rng: {
+        "url": "/equipment-categories/", "json": {"category_name": f"bench-{next(ctx.unique)}"},
+    },
+    ("POST", "/equipment/"): lambda ctx, rng: {"url": "/equipment/", "json": equipment_body(ctx, rng)},
+    ("POST", "/equipment/bulk"): lambda ctx, rng: {"url": "/equipment/bulk", "json": [equipment_body(ctx, rng) for _ in range(20)]},
+    ("POST", "/services/"): lambda ctx, rng: {"url": "/services/", "json": {"service_name": "bench", "hourly_rate": 100}},
+    ("POST", "/orders/"): lambda ctx, rng: {"url": "/orders/", "json": order_body(ctx, rng)},
+    ("POST", "/orders/full"): lambda ctx, rng: {
+        "url": "/orders/full",
+        "json": {**order_body(ctx, rng), "lines": [
+            {"service_id": ctx.id(rng, "Services"), "equipment_id": ctx.id(rng, "Equipment")} for _ in range(2)
+        ]},
+    },
+    ("PATCH", "/orders/{order_id}/status"): lambda ctx, rng: {
+        "url": f"/orders/{ctx.id(rng, 'Orders') // 2}/status", "json": {"status": "completed"},
+    },
+    ("POST", "/order-services/bulk"): lambda ctx, rng: {
+        "url": "/order-services/bulk",
+        "json": [
+            {"order_id": ctx.id(rng, "Orders"), "service_id": ctx.id(rng, "Services"), "unit_price": 100, "total_price": 100}
+            for _ in range(20)
+        ],
+    },
+    ("POST", "/equipment-returns/"): lambda ctx, rng: {
+        "url": "/equipment-returns/",
+        "json": dict(zip(("order_id", "equipment_id"), rng.choice(ctx.active_lines)), returned_by_user_id=ctx.id(rng, "Users")),
+    },
+    ("POST", "/consumables/"): lambda ctx, rng: {"url": "/consumables/", "json": {"item_name": "bench", "current_stock": 10}},
+    ("POST", "/consumable-transactions/"): lambda ctx, rng: {"url": "/consumable-transactions/", "json": transaction_body(ctx, rng)},
+    ("POST", "/consumable-transactions/batch"): lambda ctx, rng: {
+        "url": "/consumable-transactions/batch", "json": [transaction_body(ctx, rng) for _ in range(20)],
+    },
+}
+
+
+def percentile(ordered: List[float], share: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+async def run_endpoint(client, method: str, build, ctx: Context, rng: random.Random, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            options = build(ctx, rng)
+            started = time.perf_counter()
+            response = await client.request(method, **options)
+            await response.aread()
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    os.environ["IGORA_DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.abspath(args.db)}"
+    # SQLite has one writer: with more connections, a read transaction that goes on
+    # to write fails with "database is locked" instead of waiting its turn.
+    os.environ.setdefault("IGORA_DB_POOL_SIZE", "1")
+    os.environ.setdefault("IGORA_DB_MAX_OVERFLOW", "0")
+    # bench.seed imported config already; settings must be re-read before main builds the engine.
+    get_settings.cache_clear()
+    import httpx
+    from fastapi.routing import APIRoute
+
+    import main
+
+    ctx = inspect(args.db)
+    rng = random.Random(args.seed)
+    routes = [
+        (method, route.path) for route in main.app.routes if isinstance(route, APIRoute) for method in sorted(route.methods)
+    ]
+    selected = [key for key in routes if args.routes is None or any(part in key[1] for part in args.routes)]
+    if args.read_only:
+        selected = [key for key in selected if key[0] == "GET"]
+    # Reads first, so writes made by the run do not change what the reads see.
+    selected.sort(key=lambda key: key[0] != "GET")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "db": os.path.basename(args.db),
+            "requests_per_endpoint": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "endpoints": {},
+        "skipped": [f"{method} {path}" for method, path in routes if (method, path) not in SCENARIOS],
+    }
+    async with main.lifespan(main.app):
+        # Unhandled errors are counted as 500s rather than ending the run.
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for _ in range(max(args.concurrency, 4)):
+                response = await client.post("/auth/login", json={"login": f"user{ctx.id(rng, 'Users')}", "password": BENCH_PASSWORD})
+                ctx.session_ids.append(response.json()["session_id"])
+            for method, path in selected:
+                build = SCENARIOS.get((method, path))
+                if build is None:
+                    continue
+                if path == "/auth/logout":
+                    for _ in range(args.requests):
+                        response = await client.post("/auth/login", json={"login": "user1", "password": BENCH_PASSWORD})
+                        ctx.session_ids.append(response.json()["session_id"])
+                if method == "GET":
+                    # Lazily loaded indexes and caches are filled before timing starts.
+                    for _ in range(args.warmup):
+                        await client.request(method, **build(ctx, rng))
+                result = report["endpoints"][f"{method} {path}"] = await run_endpoint(
+                    client, method, build, ctx, rng, args.requests, args.concurrency
+                )
+                print(f"{method:6} {path:40} {result['p99_ms']:>9} ms p99", file=sys.stderr, flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per read endpoint")
+    parser.add_argument("--routes", nargs="*", help="only routes whose path contains one of these")
+    parser.add_argument("--read-only", action="store_true", help="skip routes that write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
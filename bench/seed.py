@@ -0,0 +1,282 @@
+"""Fill a fresh SQLite database with a reproducible, realistically sized data set.
+
+    python -m bench.seed [--db PATH] [--scale 1.0] [--seed 1]
+
+At scale 1.0: 100k clients, 20k equipment items, 1M orders with about 2M lines.
+The same seed and scale always produce the same rows.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import models
+import passwords
+
+DEFAULT_DB = "igora-bench.db"
+# Fixed "today" of the data set, so runs do not depend on the wall clock.
+BASE_DATE = datetime(2025, 12, 1, 9, 0)
+HISTORY_DAYS = 730
+ACTIVE_SHARE = 0.005
+BENCH_PASSWORD = "bench"
+CHUNK_ROWS = 10_000
+
+VOLUMES = {
+    "users": 50,
+    "clients": 100_000,
+    "equipment": 20_000,
+    "orders": 1_000_000,
+    "consumables": 60,
+    "consumable_transactions": 50_000,
+}
+
+CATEGORIES = ["Горные лыжи", "Сноуборды", "Лыжные ботинки", "Ботинки для сноуборда", "Шлемы", "Палки", "Очки", "Ватрушки"]
+BRANDS = ["Atomic", "Rossignol", "Salomon", "Head", "Fischer", "Burton", "Elan", "Völkl"]
+LAST_NAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Фёдоров",
+    "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев",
+]
+FIRST_NAMES = ["Александр", "Сергей", "Дмитрий", "Андрей", "Алексей", "Максим", "Евгений", "Иван", "Михаил", "Артём"]
+
+
+def volumes(scale: float) -> Dict[str, int]:
+    return {name: max(1, int(count * scale)) for name, count in VOLUMES.items()}
+
+
+def chunks(rows: Iterable[dict], size: int = CHUNK_ROWS) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def roles():
+    for name in ("cashier", "senior_shift", "admin"):
+        yield dict(role_name=name, role_description=name, permissions={"all": name == "admin"})
+
+
+def users(count: int, rng: random.Random):
+    password_hash = passwords.hash_password(BENCH_PASSWORD)
+    for user_id in range(1, count + 1):
+        yield dict(
+            user_id=user_id,
+            login=f"user{user_id}",
+            password_hash=password_hash,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            role_id=1 + (user_id % 3),
+            is_active=True,
+            created_at=BASE_DATE - timedelta(days=HISTORY_DAYS),
+        )
+
+
+def clients(count: int, rng: random.Random):
+    for client_id in range(1, count + 1):
+        last = rng.choice(LAST_NAMES) + rng.choice(["", "", "а", "ский", "ин"])
+        yield dict(
+            client_id=client_id,
+            client_code=f"C{client_id:07d}",
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=last,
+            email=f"client{client_id}@example.com" if rng.random() < 0.6 else None,
+            phone=f"+7 9{rng.randrange(10 ** 9):09d}",
+            birth_date=date(1960, 1, 1) + timedelta(days=rng.randrange(45 * 365)),
+            created_at=BASE_DATE - timedelta(days=rng.randrange(HISTORY_DAYS)),
+        )
+
+
+def categories():
+    for category_id, name in enumerate(CATEGORIES, 1):
+        yield dict(category_id=category_id, category_name=name, is_active=True)
+
+
+def services():
+    for service_id, name in enumerate(CATEGORIES, 1):
+        hourly = Decimal(100 + 50 * service_id)
+        yield dict(
+            service_id=service_id,
+            service_name=f"Прокат: {name}",
+            category_id=service_id,
+            hourly_rate=hourly,
+            daily_rate=hourly * 6,
+            deposit_amount=hourly * 10,
+            is_active=True,
+        )
+
+
+def equipment(count: int, rng: random.Random):
+    for equipment_id in range(1, count + 1):
+        yield dict(
+            equipment_id=equipment_id,
+            category_id=1 + equipment_id % len(CATEGORIES),
+            brand=rng.choice(BRANDS),
+            model=f"M{rng.randrange(100):02d}",
+            size=str(rng.choice([36, 38, 40, 42, 44, 150, 160, 170, 180])),
+            condition_status=rng.choice(list(models.EquipmentConditionStatus)),
+            purchase_date=date(2020, 1, 1) + timedelta(days=rng.randrange(1500)),
+            is_available=True,
+            barcode=f"EQ{equipment_id:08d}",
+        )
+
+
+def orders(count: int, counts: Dict[str, int], rng: random.Random):
+    """Yield ``(order, lines)``; the newest ``ACTIVE_SHARE`` of orders are still active."""
+    active_from = count - max(1, int(count * ACTIVE_SHARE))
+    line_id = 0
+    for order_id in range(1, count + 1):
+        active = order_id > active_from
+        if active:
+            start = BASE_DATE - timedelta(hours=rng.randrange(1, 6))
+        else:
+            start = BASE_DATE - timedelta(days=HISTORY_DAYS * (count - order_id) / count + 1, hours=rng.randrange(8))
+        hours = rng.choice([1, 2, 3, 4, 6, 8, 24])
+        status = models.OrderStatus.active if active else (
+            models.OrderStatus.cancelled if rng.random() < 0.03 else models.OrderStatus.completed
+        )
+        lines = []
+        total = Decimal(0)
+        for _ in range(rng.choice([1, 1, 2, 2, 2, 3])):
+            line_id += 1
+            equipment_id = rng.randrange(1, counts["equipment"] + 1)
+            service_id = 1 + equipment_id % len(CATEGORIES)  # one service per category
+            unit_price = Decimal(100 + 50 * service_id) * hours
+            total += unit_price
+            lines.append(dict(
+                order_service_id=line_id,
+                order_id=order_id,
+                service_id=service_id,
+                equipment_id=equipment_id,
+                quantity=1,
+                unit_price=unit_price,
+                total_price=unit_price,
+                rental_hours=hours,
+            ))
+        number = f"{order_id:06d}"
+        yield dict(
+            order_id=order_id,
+            order_number="O" + number,
+            client_id=rng.randrange(1, counts["clients"] + 1),
+            user_id=rng.randrange(1, counts["users"] + 1),
+            order_date=start,
+            start_date=start,
+            end_date=start + timedelta(hours=hours),
+            total_amount=total,
+            deposit_amount=Decimal(1000) * len(lines),
+            status=status,
+            barcode=f"{number}{start:%d%m%y%H%M}{min(hours, 99):02d}{rng.randrange(10 ** 6):06d}",
+            created_at=start,
+        ), lines
+
+
+def consumables(count: int, rng: random.Random):
+    for consumable_id in range(1, count + 1):
+        minimum = Decimal(rng.randrange(5, 50))
+        yield dict(
+            consumable_id=consumable_id,
+            item_name=f"Расходник {consumable_id}",
+            unit_of_measure="шт",
+            # Every fifth item starts below its minimum, so low-stock has rows.
+            current_stock=minimum / 2 if consumable_id % 5 == 0 else minimum * 20,
+            minimum_stock=minimum,
+            unit_cost=Decimal(rng.randrange(50, 500)),
+            last_updated=BASE_DATE,
+            is_active=True,
+        )
+
+
+def consumable_transactions(count: int, counts: Dict[str, int], rng: random.Random):
+    for transaction_id in range(1, count + 1):
+        yield dict(
+            transaction_id=transaction_id,
+            consumable_id=rng.randrange(1, counts["consumables"] + 1),
+            user_id=rng.randrange(1, counts["users"] + 1),
+            transaction_type=rng.choice(list(models.ConsumableTransactionType)),
+            quantity=Decimal(rng.randrange(1, 10)),
+            transaction_date=BASE_DATE - timedelta(days=HISTORY_DAYS * (count - transaction_id) / count),
+        )
+
+
+async def seed(path: str, scale: float = 1.0, seed_value: int = 1) -> Dict[str, int]:
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed_value)
+    counts = volumes(scale)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    written: Dict[str, int] = {}
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(models.Base.metadata.create_all)
+
+        async def load(model, rows: Iterable[dict]) -> None:
+            async with engine.begin() as connection:
+                for chunk in chunks(rows):
+                    await connection.execute(insert(model), chunk)
+                    written[model.__tablename__] = written.get(model.__tablename__, 0) + len(chunk)
+
+        await load(models.Role, roles())
+        await load(models.User, users(counts["users"], rng))
+        await load(models.Client, clients(counts["clients"], rng))
+        await load(models.EquipmentCategory, categories())
+        await load(models.Service, services())
+        await load(models.Equipment, equipment(counts["equipment"], rng))
+
+        async with engine.begin() as connection:
+            order_rows, line_rows = [], []
+            for order, lines in orders(counts["orders"], counts, rng):
+                order_rows.append(order)
+                line_rows.extend(lines)
+                if len(order_rows) == CHUNK_ROWS:
+                    await connection.execute(insert(models.Order), order_rows)
+                    await connection.execute(insert(models.OrderService), line_rows)
+                    written["Orders"] = written.get("Orders", 0) + len(order_rows)
+                    written["Order_Services"] = written.get("Order_Services", 0) + len(line_rows)
+                    order_rows, line_rows = [], []
+            if order_rows:
+                await connection.execute(insert(models.Order), order_rows)
+                await connection.execute(insert(models.OrderService), line_rows)
+                written["Orders"] = written.get("Orders", 0) + len(order_rows)
+                written["Order_Services"] = written.get("Order_Services", 0) + len(line_rows)
+            # What tr_update_equipment_availability would have done for the open orders.
+            await connection.execute(
+                update(models.Equipment)
+                .where(models.Equipment.equipment_id.in_(
+                    select(models.OrderService.equipment_id)
+                    .join(models.Order, models.Order.order_id == models.OrderService.order_id)
+                    .where(models.Order.status == models.OrderStatus.active)
+                ))
+                .values(is_available=False)
+            )
+
+        await load(models.Consumable, consumables(counts["consumables"], rng))
+        await load(models.ConsumableTransaction, consumable_transactions(counts["consumable_transactions"], counts, rng))
+    finally:
+        await engine.dispose()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    written = asyncio.run(seed(args.db, args.scale, args.seed))
+    for table, count in written.items():
+        print(f"{table:28} {count:>10}")
+    print(f"seeded {args.db} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
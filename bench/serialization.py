@@ -0,0 +1,110 @@
+"""Compare FastAPI's response_model serialization with ``serialization.dump_json``.
+
+    python -m bench.serialization [--rounds N]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import models
+import schemas
+import serialization
+
+
+def equipment_rows(n: int):
+    return [
+        models.Equipment(
+            equipment_id=i,
+            category_id=i % 7 + 1,
+            brand="Atomic",
+            model=f"Redster {i}",
+            size=str(150 + i % 30),
+            condition_status=models.EquipmentConditionStatus.good,
+            purchase_date=date(2023, 1, 1) + timedelta(days=i % 365),
+            last_maintenance_date=date(2024, 1, 1),
+            is_available=True,
+            barcode=f"EQ{i:010d}",
+            notes=None,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def order_rows(n: int):
+    start = datetime(2025, 1, 10, 9, 0)
+    return [
+        models.Order(
+            order_id=i,
+            order_number=f"O{i:06d}",
+            client_id=i % 50 + 1,
+            user_id=1,
+            order_date=start,
+            start_date=start,
+            end_date=start + timedelta(hours=4),
+            total_amount=Decimal("1500.00"),
+            deposit_amount=Decimal("500.00"),
+            status=models.OrderStatus.active,
+            barcode=f"{i:06d}1001250900{4:02d}123456",
+            notes="",
+            created_at=start,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+@lru_cache(maxsize=None)
+def response_field(model):
+    return create_model_field(name="Response", type_=List[model], mode="serialization")
+
+
+def fastapi_path(model, rows) -> bytes:
+    content = asyncio.run(serialize_response(field=response_field(model), response_content=rows, is_coroutine=True))
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_path(model, rows) -> bytes:
+    return serialization.dump_json(model, rows, many=True)
+
+
+def measure(fn, model, rows, rounds: int) -> float:
+    fn(model, rows)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(model, rows)
+    return len(rows) * rounds / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for name, model, build in (("equipment", schemas.Equipment, equipment_rows), ("orders", schemas.Order, order_rows)):
+        for size in (100, 1000):
+            rows = build(size)
+            assert json.loads(fastapi_path(model, rows)) == json.loads(fast_path(model, rows))
+            baseline = measure(fastapi_path, model, rows, args.rounds)
+            fast = measure(fast_path, model, rows, args.rounds)
+            results.append({
+                "payload": name,
+                "rows": size,
+                "fastapi_rows_per_s": round(baseline),
+                "fast_json_rows_per_s": round(fast),
+                "speedup": round(fast / baseline, 2),
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -196,6 +196,56 @@ CREATE TABLE `Reports_Cache` (
     `expires_at` TIMESTAMP NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- 15. Последовательности номеров (блоки номеров выдаются приложению, hi-lo)
+CREATE TABLE `Sequences` (
+    `sequence_name` VARCHAR(50) PRIMARY KEY,
+    `next_value` BIGINT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 16. Архив заказов (закрытые заказы переносит src/archive.py, id сохраняются)
+CREATE TABLE `Orders_Archive` (
+    `order_id` INT PRIMARY KEY,
+    `order_number` VARCHAR(50) UNIQUE NOT NULL,
+    `client_id` INT NOT NULL,
+    `user_id` INT NOT NULL,
+    `order_date` TIMESTAMP NULL,
+    `start_date` DATETIME NOT NULL,
+    `end_date` DATETIME NOT NULL,
+    `total_amount` DECIMAL(12,2) NOT NULL DEFAULT 0,
+    `deposit_amount` DECIMAL(10,2),
+    `status` ENUM('active', 'completed', 'cancelled', 'archived'),
+    `barcode` VARCHAR(255) UNIQUE,
+    `notes` TEXT,
+    `created_at` TIMESTAMP NULL,
+    `archived_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 17. Архив услуг в заказе
+CREATE TABLE `Order_Services_Archive` (
+    `order_service_id` INT PRIMARY KEY,
+    `order_id` INT NOT NULL,
+    `service_id` INT NOT NULL,
+    `equipment_id` INT,
+    `quantity` INT NOT NULL DEFAULT 1,
+    `unit_price` DECIMAL(10,2) NOT NULL,
+    `total_price` DECIMAL(10,2) NOT NULL,
+    `rental_hours` INT,
+    `notes` TEXT
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 18. Архив возвратов оборудования
+CREATE TABLE `Equipment_Returns_Archive` (
+    `return_id` INT PRIMARY KEY,
+    `order_id` INT NOT NULL,
+    `equipment_id` INT NOT NULL,
+    `returned_by_user_id` INT NOT NULL,
+    `return_date` TIMESTAMP NULL,
+    `condition_on_return` ENUM('excellent', 'good', 'satisfactory', 'damaged'),
+    `damage_description` TEXT,
+    `additional_charges` DECIMAL(10,2) DEFAULT 0,
+    `notes` TEXT
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- ================================================================
 -- СОЗДАНИЕ ВНЕШНИХ КЛЮЧЕЙ
 -- ================================================================
@@ -290,6 +340,7 @@ CREATE INDEX `idx_orders_date` ON `Orders`(`order_date`);
 CREATE INDEX `idx_orders_status` ON `Orders`(`status`);
 CREATE INDEX `idx_orders_number` ON `Orders`(`order_number`);
 CREATE INDEX `idx_orders_client` ON `Orders`(`client_id`, `order_date`);
+CREATE INDEX `idx_orders_user` ON `Orders`(`user_id`, `order_date`);
 
 -- История входов
 CREATE INDEX `idx_login_history_time` ON `Login_History`(`attempt_time`);
@@ -300,6 +351,8 @@ CREATE INDEX `idx_login_history_success` ON `Login_History`(`is_successful`, `at
 CREATE INDEX `idx_equipment_available` ON `Equipment`(`is_available`);
 CREATE INDEX `idx_equipment_category` ON `Equipment`(`category_id`);
 CREATE INDEX `idx_equipment_barcode` ON `Equipment`(`barcode`);
+CREATE INDEX `idx_equipment_condition` ON `Equipment`(`condition_status`);
+CREATE INDEX `idx_equipment_size` ON `Equipment`(`size`);
 
 -- Услуги в заказе
 CREATE INDEX `idx_order_services_order` ON `Order_Services`(`order_id`);
@@ -309,10 +362,22 @@ CREATE INDEX `idx_order_services_service` ON `Order_Services`(`service_id`);
 CREATE INDEX `idx_returns_date` ON `Equipment_Returns`(`return_date`);
 CREATE INDEX `idx_returns_order` ON `Equipment_Returns`(`order_id`);
 
+-- Архив заказов
+CREATE INDEX `idx_orders_archive_date` ON `Orders_Archive`(`order_date`);
+CREATE INDEX `idx_orders_archive_client` ON `Orders_Archive`(`client_id`, `order_date`);
+CREATE INDEX `idx_order_services_archive_order` ON `Order_Services_Archive`(`order_id`);
+CREATE INDEX `idx_returns_archive_order` ON `Equipment_Returns_Archive`(`order_id`);
+
 -- Сеансы
 CREATE INDEX `idx_sessions_active` ON `Session_Management`(`is_active`, `last_activity`);
 CREATE INDEX `idx_sessions_user` ON `Session_Management`(`user_id`);
 
+-- Кэш отчетов
+CREATE INDEX `idx_reports_cache_key` ON `Reports_Cache`(`report_type`, `parameters_hash`);
+
+-- Движение расходных материалов
+CREATE INDEX `idx_consumable_transactions_item` ON `Consumable_Transactions`(`consumable_id`, `transaction_date`);
+
 -- ================================================================
 -- CHECK-ОГРАНИЧЕНИЯ
 -- ================================================================
@@ -419,21 +484,8 @@ BEGIN
 END//
 DELIMITER ;
 
--- Автоматический расчет общей стоимости услуг в заказе
-DELIMITER //
-CREATE TRIGGER `tr_calculate_order_total`
-AFTER INSERT ON `Order_Services`
-FOR EACH ROW
-BEGIN
-    UPDATE `Orders` 
-    SET total_amount = (
-        SELECT COALESCE(SUM(total_price), 0) 
-        FROM `Order_Services` 
-        WHERE order_id = NEW.order_id
-    )
-    WHERE order_id = NEW.order_id;
-END//
-DELIMITER ;
+-- Общую стоимость заказа (Orders.total_amount) считает приложение, один раз на
+-- заказ, см. migrations/001_order_totals_from_app.sql
 
 -- ================================================================
 -- ХРАНИМЫЕ ПРОЦЕДУРЫ
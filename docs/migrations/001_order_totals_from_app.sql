@@ -0,0 +1,19 @@
+-- Orders.total_amount считает приложение, а не триггер.
+--
+-- tr_calculate_order_total (AFTER INSERT ON Order_Services, FOR EACH ROW)
+-- пересчитывал SUM по всему заказу на каждую вставленную строку, так что заказ
+-- из N строк стоил O(N²). Теперь POST /orders/full записывает итог один раз
+-- вместе с заказом, а POST /order-services/bulk пересчитывает каждый
+-- затронутый заказ один раз в той же транзакции.
+--
+-- Строки, вставленные в Order_Services вручную, итог больше не обновляют.
+
+DROP TRIGGER IF EXISTS `tr_calculate_order_total`;
+
+-- Выравниваем итоги, посчитанные до миграции.
+UPDATE `Orders` o
+SET o.total_amount = (
+    SELECT COALESCE(SUM(os.total_price), 0)
+    FROM `Order_Services` os
+    WHERE os.order_id = o.order_id
+);
@@ -0,0 +1,128 @@
+import asyncio
+import secrets
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import Integer, cast, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+import models
+from config import get_settings
+
+ORDER_NUMBER_PREFIX = "O"
+
+
+class HiLoAllocator:
+    """Hands out values of a named counter from blocks reserved in ``Sequences``.
+
+    Each worker bumps the counter row by ``block_size`` in a short transaction
+    of its own and then serves the block from memory, so allocating a number is
+    neither a table scan nor a lock held for the lifetime of the caller's
+    transaction. Values left in a block when the worker stops are skipped.
+    """
+
+    def __init__(self, name: str, block_size: int, seed: Callable[[AsyncSession], Awaitable[int]]):
+        self.name = name
+        self.block_size = block_size
+        self.seed = seed
+        self._next = 0
+        self._limit = 0
+        self._lock = asyncio.Lock()
+
+    async def next(self) -> int:
+        async with self._lock:
+            if self._next >= self._limit:
+                await self._reserve_block()
+            value = self._next
+            self._next += 1
+            return value
+
+    async def _reserve_block(self) -> None:
+        counter = models.SequenceCounter
+        while True:
+            async with database.async_session() as session:
+                try:
+                    async with session.begin():
+                        result = await session.execute(
+                            update(counter)
+                            .where(counter.sequence_name == self.name)
+                            .values(next_value=counter.next_value + self.block_size)
+                        )
+                        if result.rowcount:
+                            end = (await session.execute(
+                                select(counter.next_value).where(counter.sequence_name == self.name)
+                            )).scalar_one()
+                            start = end - self.block_size
+                        else:
+                            # First use: start after the highest value already in the data.
+                            start = await self.seed(session) + 1
+                            end = start + self.block_size
+                            session.add(counter(sequence_name=self.name, next_value=end))
+                except IntegrityError:
+                    # Another worker created the row first; take a block from it.
+                    continue
+            self._next, self._limit = start, end
+            return
+
+
+async def _max_order_number(session: AsyncSession) -> int:
+    number = cast(func.substr(models.Order.order_number, 2), Integer)
+    result = await session.execute(
+        select(func.max(number)).where(models.Order.order_number.like(ORDER_NUMBER_PREFIX + "%"))
+    )
+    return result.scalar() or 0
+
+
+order_numbers = HiLoAllocator("order_number", get_settings().order_number_block_size, _max_order_number)
+
+
+def format_order_number(value: int) -> str:
+    return f"{ORDER_NUMBER_PREFIX}{value:06d}"
+
+
+def format_order_barcode(order_number: str, created_at: datetime, rental_hours: int) -> str:
+    """Barcode in the ``sp_generate_barcode`` layout.
+
+    Digits of the order number, the creation time as ``ddmmyyHHMM``, the rental
+    length in hours and a random six-digit code. The order number prefix keeps
+    the barcode unique.
+    """
+    return "".join((
+        order_number[len(ORDER_NUMBER_PREFIX):],
+        created_at.strftime("%d%m%y%H%M"),
+        f"{min(max(rental_hours, 0), 99):02d}",
+        f"{secrets.randbelow(1_000_000):06d}",
+    ))
+
+
+# Digits of the order number, ddmmyyHHMM, two digits of hours, six random digits.
+_BARCODE_TAIL = 10 + 2 + 6
+
+
+def parse_order_barcode(barcode: str) -> Optional[str]:
+    """Order number encoded in a ``format_order_barcode`` barcode, or ``None`` if it is not one."""
+    if not barcode.isdigit() or len(barcode) <= _BARCODE_TAIL:
+        return None
+    number, created = barcode[:-_BARCODE_TAIL], barcode[-_BARCODE_TAIL:-8]
+    try:
+        datetime.strptime(created, "%d%m%y%H%M")
+    except ValueError:
+        return None
+    return ORDER_NUMBER_PREFIX + number
+
+
+async def next_order_number() -> str:
+    return format_order_number(await order_numbers.next())
+
+
+async def allocate_order_identifiers(
+    order_number: Optional[str], barcode: Optional[str], rental_hours: int, created_at: Optional[datetime] = None
+):
+    """Fill in whichever of ``order_number`` and ``barcode`` the client left out."""
+    if order_number is None:
+        order_number = await next_order_number()
+    if barcode is None and order_number.startswith(ORDER_NUMBER_PREFIX):
+        barcode = format_order_barcode(order_number, created_at or datetime.now(), rental_hours)
+    return order_number, barcode
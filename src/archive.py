@@ -0,0 +1,181 @@
+"""Move closed orders out of the hot tables.
+
+    uv run python src/archive.py --after-days 365
+
+Completed and cancelled orders whose ``end_date`` is older than
+``IGORA_ARCHIVE_AFTER_DAYS`` are copied, with their ``Order_Services`` and
+``Equipment_Returns`` rows, into the ``*_Archive`` tables and deleted from the
+originals. The app does the same every ``IGORA_ARCHIVE_INTERVAL_SECONDS`` when
+that is set.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+import models
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = (models.OrderStatus.completed, models.OrderStatus.cancelled)
+# (hot table, archive table); copied parents first, deleted children first.
+MOVES = (
+    (models.Order, models.ArchivedOrder),
+    (models.OrderService, models.ArchivedOrderService),
+    (models.EquipmentReturn, models.ArchivedEquipmentReturn),
+)
+
+
+async def _newest_owners(db: AsyncSession) -> Tuple[int, Set[int]]:
+    """The highest order id, and the orders owning the highest line and return ids.
+
+    Those rows stay put: with InnoDB (before 8.0) and SQLite the next
+    AUTO_INCREMENT value is the table's max + 1, so deleting the newest row
+    would hand its id out again and the copy in the archive would collide.
+    """
+    result = await db.execute(select(func.max(models.Order.order_id)))
+    max_order_id = result.scalar() or 0
+    owners = set()
+    for model, pk in ((models.OrderService, models.OrderService.order_service_id), (models.EquipmentReturn, models.EquipmentReturn.return_id)):
+        result = await db.execute(select(model.order_id).order_by(pk.desc()).limit(1))
+        owners.update(result.scalars())
+    return max_order_id, owners
+
+
+class OrderArchiver:
+    """Archives closed orders in small batches, walking ``Orders`` by primary key.
+
+    Each batch is one short transaction (copy, then delete, ``batch_size``
+    orders), followed by ``pause_seconds`` of sleep, so row locks are held
+    briefly and live traffic gets the connection and the disk in between.
+    Batches are picked with ``order_id > last`` on the primary key, never
+    with OFFSET, so a pass reads ``Orders`` once however many batches it takes.
+    """
+
+    def __init__(self, after_days: int, batch_size: int, pause_seconds: float):
+        self.after_days = after_days
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_seconds
+        self.runs = 0
+        self.batches = 0
+        self.archived = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Archive everything currently due; returns the number of orders moved."""
+        cutoff = datetime.now() - timedelta(days=self.after_days)
+        async with database.async_session() as db:
+            max_order_id, keep = await _newest_owners(db)
+        last_id = 0
+        moved = 0
+        while True:
+            async with database.async_session() as db:
+                order_ids = await self._next_batch(db, last_id, max_order_id, keep, cutoff)
+                if not order_ids:
+                    break
+                await self._move(db, order_ids)
+            last_id = order_ids[-1]
+            moved += len(order_ids)
+            self.archived += len(order_ids)
+            self.batches += 1
+            await asyncio.sleep(self.pause_seconds)
+        self.runs += 1
+        if moved:
+            logger.info("Archived %d orders ending before %s", moved, cutoff.date())
+        return moved
+
+    async def _next_batch(self, db: AsyncSession, last_id: int, max_order_id: int, keep: Set[int], cutoff: datetime) -> List[int]:
+        stmt = (
+            select(models.Order.order_id)
+            .where(
+                models.Order.order_id > last_id,
+                models.Order.order_id < max_order_id,
+                models.Order.status.in_(CLOSED_STATUSES),
+                models.Order.end_date < cutoff,
+            )
+            .order_by(models.Order.order_id)
+            .limit(self.batch_size)
+        )
+        if keep:
+            stmt = stmt.where(models.Order.order_id.not_in(keep))
+        result = await db.execute(stmt)
+        return list(result.scalars())
+
+    async def _move(self, db: AsyncSession, order_ids: List[int]) -> None:
+        archived_at = literal(datetime.now(), DateTime)
+        for source, target in MOVES:
+            names = [column.name for column in source.__table__.columns]
+            columns = [source.__table__.c[name] for name in names]
+            if target is models.ArchivedOrder:
+                names.append("archived_at")
+                columns.append(archived_at)
+            await db.execute(
+                insert(target).from_select(names, select(*columns).where(source.order_id.in_(order_ids)))
+            )
+        for source, _ in reversed(MOVES):
+            await db.execute(
+                delete(source).where(source.order_id.in_(order_ids)).execution_options(synchronize_session=False)
+            )
+        await db.commit()
+
+    def start(self, interval: float) -> None:
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        # A batch cut short rolls back whole; the next run picks it up again.
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"runs": self.runs, "batches": self.batches, "archived": self.archived, "failures": self.failures}
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.run_once()
+            except Exception:
+                self.failures += 1
+                logger.exception("Order archiving failed; retrying on the next run")
+
+
+_settings = get_settings()
+archiver = OrderArchiver(_settings.archive_after_days, _settings.archive_batch_size, _settings.archive_pause_seconds)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    await database.init_engine(settings)
+    try:
+        job = OrderArchiver(args.after_days, args.batch_size, args.pause)
+        moved = await job.run_once()
+        print(f"archived {moved} orders in {job.batches} batches")
+    finally:
+        await database.dispose_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--after-days", type=int, default=_settings.archive_after_days)
+    parser.add_argument("--batch-size", type=int, default=_settings.archive_batch_size)
+    parser.add_argument("--pause", type=float, default=_settings.archive_pause_seconds, help="seconds between batches")
+    args = parser.parse_args()
+    logging.basicConfig()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
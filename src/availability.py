@@ -0,0 +1,137 @@
+import bisect
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import get_settings
+from reloadable import ReloadableIndex
+
+
+def naive(value: datetime) -> datetime:
+    # Orders store naive local DATETIMEs.
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+@dataclass
+class ItemSchedule:
+    """Bookings of one equipment item, sorted by start.
+
+    ``max_end[i]`` is the latest end among the first ``i + 1`` bookings, so an
+    overlap test is one bisect even if bookings overlap each other.
+    """
+
+    starts: List[datetime] = field(default_factory=list)
+    bookings: List[Tuple[datetime, datetime, int]] = field(default_factory=list)
+    max_end: List[datetime] = field(default_factory=list)
+
+    def _rebuild_max_end(self, begin: int) -> None:
+        del self.max_end[begin:]
+        latest = self.max_end[-1] if self.max_end else None
+        for _, end, _ in self.bookings[begin:]:
+            latest = end if latest is None or end > latest else latest
+            self.max_end.append(latest)
+
+    def add(self, start: datetime, end: datetime, order_id: int) -> None:
+        if any(booking[2] == order_id for booking in self.bookings):
+            return
+        position = bisect.bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.bookings.insert(position, (start, end, order_id))
+        self._rebuild_max_end(position)
+
+    def remove(self, order_id: int) -> None:
+        for position, booking in enumerate(self.bookings):
+            if booking[2] == order_id:
+                del self.starts[position]
+                del self.bookings[position]
+                self._rebuild_max_end(position)
+                return
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        position = bisect.bisect_left(self.starts, end)
+        return position == 0 or self.max_end[position - 1] <= start
+
+    def __bool__(self) -> bool:
+        return bool(self.bookings)
+
+
+@dataclass
+class ItemInfo:
+    category_id: int
+    size: Optional[str]
+    rentable: bool = True
+
+
+class AvailabilityIndex(ReloadableIndex):
+    """In-memory interval index of equipment bookings for active orders.
+
+    Loaded from the database on first use and refreshed every
+    ``refresh_seconds``; writes made through this worker are applied
+    incrementally in between.
+    """
+
+    STATE = ("items", "by_category", "schedules", "order_items")
+
+    def __init__(self, refresh_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        super().__init__(refresh_seconds, clock)
+
+    def _reset(self) -> None:
+        self.items: Dict[int, ItemInfo] = {}
+        self.by_category: Dict[int, Set[int]] = {}
+        self.schedules: Dict[int, ItemSchedule] = {}
+        self.order_items: Dict[int, Set[int]] = {}
+
+    def _load(self, data: tuple) -> None:
+        # (items as (equipment_id, category_id, size, rentable), bookings as (order_id, equipment_id, start, end))
+        items, bookings = data
+        for equipment_id, category_id, size, rentable in items:
+            self._add_equipment(equipment_id, category_id, size, rentable)
+        for order_id, equipment_id, start, end in bookings:
+            self._book(order_id, equipment_id, start, end)
+
+    def add_equipment(self, equipment_id: int, category_id: int, size: Optional[str], rentable: bool = True) -> None:
+        self._record("add_equipment", (equipment_id, category_id, size, rentable))
+
+    def book(self, order_id: int, equipment_id: int, start: datetime, end: datetime) -> None:
+        self._record("book", (order_id, equipment_id, naive(start), naive(end)))
+
+    def release_order(self, order_id: int) -> None:
+        self._record("release_order", (order_id,))
+
+    def _add_equipment(self, equipment_id: int, category_id: int, size: Optional[str], rentable: bool) -> None:
+        previous = self.items.get(equipment_id)
+        if previous is not None:
+            self.by_category.get(previous.category_id, set()).discard(equipment_id)
+        self.items[equipment_id] = ItemInfo(category_id, size, rentable)
+        self.by_category.setdefault(category_id, set()).add(equipment_id)
+
+    def _book(self, order_id: int, equipment_id: int, start: datetime, end: datetime) -> None:
+        self.schedules.setdefault(equipment_id, ItemSchedule()).add(start, end, order_id)
+        self.order_items.setdefault(order_id, set()).add(equipment_id)
+
+    def _release_order(self, order_id: int) -> None:
+        for equipment_id in self.order_items.pop(order_id, ()):
+            schedule = self.schedules.get(equipment_id)
+            if schedule is not None:
+                schedule.remove(order_id)
+                if not schedule:
+                    del self.schedules[equipment_id]
+
+    def free(
+        self, category_id: int, start: datetime, end: datetime, size: Optional[str] = None
+    ) -> List[int]:
+        start, end = naive(start), naive(end)
+        free = []
+        for equipment_id in self.by_category.get(category_id, ()):
+            info = self.items[equipment_id]
+            if not info.rentable or (size is not None and info.size != size):
+                continue
+            schedule = self.schedules.get(equipment_id)
+            if schedule is None or schedule.is_free(start, end):
+                free.append(equipment_id)
+        free.sort()
+        return free
+
+
+index = AvailabilityIndex(get_settings().availability_refresh_seconds)
@@ -0,0 +1,148 @@
+import asyncio
+import functools
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from config import get_settings
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU cache whose entries also expire ``ttl`` seconds after they were stored."""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_caches: Dict[str, TTLCache] = {}
+_invalidation_hook: Optional[Callable[[str], Any]] = None
+_replica_lag_seconds = 0.0
+
+
+def get_cache(namespace: str, ttl: Optional[float] = None, maxsize: Optional[int] = None) -> TTLCache:
+    """The namespace's cache; ``ttl`` and ``maxsize`` override the settings when it is first created."""
+    cache = _caches.get(namespace)
+    if cache is None:
+        settings = get_settings()
+        cache = _caches[namespace] = TTLCache(
+            settings.cache_max_entries if maxsize is None else maxsize,
+            settings.cache_ttl_seconds if ttl is None else ttl,
+        )
+    return cache
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {namespace: cache.stats() for namespace, cache in _caches.items()}
+
+
+def set_invalidation_hook(hook: Optional[Callable[[str], Any]]) -> None:
+    """Register a callable that tells other workers a namespace changed.
+
+    The hook receives the namespace and may be a coroutine function (e.g. a
+    Redis or MySQL-notification publisher). The receiving worker should call
+    ``invalidate(namespace, propagate=False)``.
+    """
+    global _invalidation_hook
+    _invalidation_hook = hook
+
+
+def set_replica_lag(seconds: float) -> None:
+    """Clear a namespace once more ``seconds`` after each invalidation.
+
+    Right after a write, reads without the read-primary cookie still go to a
+    lagging replica and would cache the old rows for the full TTL; the second
+    clear drops whatever was stored in that window.
+    """
+    global _replica_lag_seconds
+    _replica_lag_seconds = seconds
+
+
+def invalidate(namespace: str, propagate: bool = True) -> None:
+    cache = get_cache(namespace)
+    cache.clear()
+    if _replica_lag_seconds > 0:
+        try:
+            asyncio.get_running_loop().call_later(_replica_lag_seconds, cache.clear)
+        except RuntimeError:
+            pass
+    if propagate and _invalidation_hook is not None:
+        result = _invalidation_hook(namespace)
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+
+def cached(namespace: str):
+    """Cache the result of an async crud function ``func(db, *args, **kwargs)``.
+
+    The session is not part of the key. A result fetched while the namespace was
+    invalidated is returned but not stored, so a write never gets masked by a
+    read that raced it.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(db, *args, **kwargs):
+            cache = get_cache(namespace)
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation
+            value = await func(db, *args, **kwargs)
+            if cache.generation == generation:
+                cache.set(key, value)
+            return value
+
+        return wrapper
+
+    return decorator
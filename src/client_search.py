@@ -0,0 +1,172 @@
+import re
+import time
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import get_settings
+from reloadable import ReloadableIndex
+
+# Share of a query word's trigrams a name word must contain to match it.
+MIN_NAME_SCORE = 0.5
+# Clients scored per query at most; the best-matching words are walked first.
+MAX_CANDIDATES = 2000
+MAX_QUERY_WORDS = 3
+
+_NON_DIGITS = re.compile(r"\D+")
+_SEPARATORS = re.compile(r"[\s,.]+")
+_PHONE_QUERY = re.compile(r"[\d\s()+\-]+")
+
+
+def normalize_name(*parts: Optional[str]) -> str:
+    text = " ".join(part for part in parts if part)
+    return _SEPARATORS.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    return _NON_DIGITS.sub("", phone or "")
+
+
+def word_grams(word: str) -> set:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def phone_grams(digits: str) -> set:
+    return {digits[i:i + 3] for i in range(len(digits) - 2)}
+
+
+def is_phone_query(query: str) -> bool:
+    return _PHONE_QUERY.fullmatch(query) is not None
+
+
+class ClientSearchIndex(ReloadableIndex):
+    """Trigram index over client names and phone digits.
+
+    Name trigrams point at distinct words (surnames, first names) rather than
+    clients, so a typo is matched against the vocabulary, which is far smaller
+    than the client base, and only the clients of matching words are scored.
+    Phones match any run of digits exactly, so a phone's last four digits find
+    it. Loaded on first use, refreshed every ``refresh_seconds``, with clients
+    created by this worker added as they are created.
+    """
+
+    STATE = ("name_lengths", "client_words", "phones", "words", "word_grams", "word_clients", "gram_words", "phone_postings")
+
+    def __init__(self, refresh_seconds: float = 600.0, clock: Callable[[], float] = time.monotonic):
+        super().__init__(refresh_seconds, clock)
+
+    def _reset(self) -> None:
+        self.name_lengths: Dict[int, int] = {}
+        self.client_words: Dict[int, Tuple[int, ...]] = {}
+        self.phones: Dict[int, str] = {}
+        self.words: Dict[str, int] = {}
+        self.word_grams: List[int] = []
+        self.word_clients: List[array] = []
+        self.gram_words: Dict[str, array] = {}
+        self.phone_postings: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.client_words)
+
+    def _load(self, data: Iterable[Tuple[int, str, str, Optional[str], Optional[str]]]) -> None:
+        for client in data:
+            self._add(*client)
+
+    def add(self, client_id: int, last_name: str, first_name: str, middle_name: Optional[str], phone: Optional[str]) -> None:
+        self._record("add", (client_id, last_name, first_name, middle_name, phone))
+
+    def _word_id(self, word: str) -> int:
+        word_id = self.words.get(word)
+        if word_id is None:
+            word_id = self.words[word] = len(self.word_clients)
+            self.word_clients.append(array("l"))
+            grams = word_grams(word)
+            self.word_grams.append(len(grams))
+            for gram in grams:
+                self.gram_words.setdefault(gram, array("l")).append(word_id)
+        return word_id
+
+    def _add(self, client_id: int, last_name: str, first_name: str, middle_name: Optional[str], phone: Optional[str]) -> None:
+        if client_id in self.client_words:
+            return
+        name = normalize_name(last_name, first_name, middle_name)
+        self.name_lengths[client_id] = len(name)
+        word_ids = tuple(dict.fromkeys(self._word_id(word) for word in name.split()))
+        self.client_words[client_id] = word_ids
+        for word_id in word_ids:
+            self.word_clients[word_id].append(client_id)
+        self.phones[client_id] = digits = normalize_phone(phone)
+        for gram in phone_grams(digits):
+            self.phone_postings.setdefault(gram, array("l")).append(client_id)
+
+    def search_phone(self, digits: str, limit: int) -> List[Tuple[int, float]]:
+        grams = phone_grams(digits)
+        if not grams:
+            return []
+        lists = sorted((self.phone_postings.get(gram, array("l")) for gram in grams), key=len)
+        candidates = set(lists[0]).intersection(*lists[1:4])
+        # Matches on the last digits rank first: that is what people read out.
+        matches = sorted(
+            (0.9 + 0.1 * self.phones[client_id].endswith(digits), client_id)
+            for client_id in candidates if digits in self.phones[client_id]
+        )
+        matches.sort(key=lambda match: -match[0])
+        return [(client_id, score) for score, client_id in matches[:limit]]
+
+    def match_word(self, word: str) -> Dict[int, float]:
+        """Vocabulary words similar to ``word``, as ``{word_id: dice score}``."""
+        grams = word_grams(word)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.gram_words.get(gram, ()))
+        needed = len(grams) * MIN_NAME_SCORE
+        return {
+            word_id: 2 * count / (len(grams) + self.word_grams[word_id])
+            for word_id, count in counts.items() if count >= needed
+        }
+
+    def search_name(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        matches = [self.match_word(word) for word in normalize_name(query).split()[:MAX_QUERY_WORDS]]
+        if not matches or not all(matches):
+            return []
+        # Walk the clients of the query word with the fewest, best words first.
+        matches.sort(key=lambda match: sum(len(self.word_clients[word_id]) for word_id in match))
+        lead, rest = matches[0], matches[1:]
+        scores: Dict[int, float] = {}
+        budget = MAX_CANDIDATES if rest else limit
+        for word_id, lead_score in sorted(lead.items(), key=lambda item: (-item[1], item[0])):
+            if budget <= 0:
+                break
+            clients = self.word_clients[word_id]
+            if not rest:
+                # One-word query: every client of the word has the word's score.
+                for client_id in clients[:budget]:
+                    scores.setdefault(client_id, lead_score)
+                budget = limit - len(scores)
+                continue
+            for client_id in islice(clients, budget):
+                total = lead_score
+                words = self.client_words[client_id]
+                for match in rest:
+                    best = max([match.get(other, 0.0) for other in words])
+                    if not best:
+                        break
+                    total += best
+                else:
+                    score = total / len(matches)
+                    if score > scores.get(client_id, 0.0):
+                        scores[client_id] = score
+            budget -= len(clients)
+        best = sorted(scores.items(), key=lambda item: (-item[1], self.name_lengths[item[0]], item[0]))
+        return best[:limit]
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """Best ``limit`` matches for ``query`` as ``(client_id, score)``, score in (0, 1]."""
+        if is_phone_query(query):
+            return self.search_phone(normalize_phone(query), limit)
+        return self.search_name(query, limit)
+
+
+index = ClientSearchIndex(get_settings().client_search_refresh_seconds)
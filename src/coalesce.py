@@ -0,0 +1,76 @@
+import functools
+import inspect
+from typing import Dict, Hashable, List, Tuple
+
+from fastapi import Request, Response
+
+import database
+import serialization
+from config import get_settings
+from singleflight import SingleFlight
+
+_flights: Dict[str, SingleFlight] = {}
+
+
+def _key(request: Request) -> Hashable:
+    return (
+        request.method,
+        tuple(sorted(request.path_params.items())),
+        tuple(sorted(request.query_params.multi_items())),
+        # Both change the answer: a 304, or rows read from the primary.
+        request.headers.get("If-None-Match"),
+        database.wants_primary(request),
+    )
+
+
+def _shared_response(status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> Response:
+    response = Response(body, status_code=status, media_type=serialization.JSON_MEDIA_TYPE)
+    response.raw_headers.extend(header for header in headers if header[0] not in (b"content-length", b"content-type"))
+    return response
+
+
+def coalesced(endpoint):
+    """Opt a read handler into request coalescing.
+
+    Identical concurrent requests (same route, path and query parameters)
+    share one run of the handler: the first runs it and serializes the result
+    with the route's response_model, the others wait for those bytes. Nothing
+    is kept once the run finishes, so this never serves stale data; it only
+    stops a burst of the same read from taking a pool connection each.
+    """
+    signature = inspect.signature(endpoint)
+    parameters = list(signature.parameters.values())
+    request_name = next((p.name for p in parameters if p.annotation is Request), None)
+    response_name = next((p.name for p in parameters if p.annotation is Response), None)
+    extra = []
+    if request_name is None:
+        extra.append(inspect.Parameter("coalesce_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+    if response_name is None:
+        extra.append(inspect.Parameter("coalesce_response", inspect.Parameter.KEYWORD_ONLY, annotation=Response))
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        request = kwargs[request_name] if request_name else kwargs.pop("coalesce_request")
+        response = kwargs[response_name] if response_name else kwargs.pop("coalesce_response")
+        if not get_settings().coalesce_reads:
+            return await endpoint(**kwargs)
+        route = request.scope["route"]
+
+        async def run():
+            result = await endpoint(**kwargs)
+            if isinstance(result, Response):
+                return result.status_code, list(result.raw_headers), result.body
+            body = serialization.dump_json(route.response_model, result, exclude_unset=route.response_model_exclude_unset)
+            return response.status_code or 200, list(response.headers.raw), body
+
+        flights = _flights.get(route.path)
+        if flights is None:
+            flights = _flights[route.path] = SingleFlight()
+        return _shared_response(*await flights.do(_key(request), run))
+
+    wrapper.__signature__ = signature.replace(parameters=parameters + extra)
+    return wrapper
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {route: {"runs": flights.calls, "saved": flights.shared} for route, flights in _flights.items()}
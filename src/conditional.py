@@ -0,0 +1,103 @@
+import hashlib
+import secrets
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+import cache
+from config import get_settings
+
+# Cache namespaces whose generation is the version of a table; bumped through
+# ``cache.invalidate`` so other workers see the change via the invalidation hook.
+TABLE_NAMESPACE_PREFIX = "table_"
+# Tables written by the MySQL triggers in docs/igora_database_structure.sql.
+TRIGGERED_WRITES = {
+    "Order_Services": ("Equipment", "Orders"),
+    "Equipment_Returns": ("Equipment", "Orders"),
+}
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+# Table versions count from zero in every process, so collection tags carry the
+# process they came from and are never matched against another worker's count.
+_BOOT = secrets.token_hex(4)
+
+
+def tables_changed(tables: Iterable[str]) -> None:
+    changed = set(tables)
+    for table in list(changed):
+        changed.update(TRIGGERED_WRITES.get(table, ()))
+    for table in changed:
+        cache.invalidate(TABLE_NAMESPACE_PREFIX + table)
+
+
+def table_version(*tables: str) -> str:
+    return ".".join(str(cache.get_cache(TABLE_NAMESPACE_PREFIX + table).generation) for table in tables)
+
+
+def version_epoch() -> int:
+    """Window of ``IGORA_ETAG_MAX_AGE_SECONDS`` that collection tags are valid in.
+
+    Table versions only see writes made through this worker. Writes on other
+    workers or outside the app (procedures, admin SQL) never bump them, so a
+    tag also changes when the window does: a missed bump costs at most one
+    window of 304s, never an unbounded run. ``0`` makes every tag unique.
+    """
+    max_age = get_settings().etag_max_age_seconds
+    return int(time.time() // max_age) if max_age > 0 else time.time_ns()
+
+
+def _digest(payload: str) -> str:
+    return hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+
+
+def collection_etag(request: Request, *tables: str) -> str:
+    """Weak ETag for a list: the tables' versions, the epoch and the query that selected the page."""
+    version = f"{table_version(*tables)}@{version_epoch()}"
+    return f'W/"{_digest(f"{_BOOT}|{request.url.path}?{request.url.query}|{version}")}"'
+
+
+def row_etag(row) -> str:
+    """Strong ETag from every mapped column of ``row``, so trigger updates change it too."""
+    values = tuple(getattr(row, column.key) for column in row.__mapper__.column_attrs)
+    return f'"{_digest(repr(values))}"'
+
+
+@lru_cache(maxsize=8)
+def _parse_cache_control(raw: str) -> Dict[str, str]:
+    # "/services/=public, max-age=60; /equipment/{equipment_id}=no-cache"
+    rules = {}
+    for rule in raw.split(";"):
+        route, _, value = rule.partition("=")
+        if route.strip() and value.strip():
+            rules[route.strip()] = value.strip()
+    return rules
+
+
+def cache_control(route: str) -> str:
+    return _parse_cache_control(get_settings().cache_control).get(route, DEFAULT_CACHE_CONTROL)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: W/"x" and "x" are the same tag.
+    wanted = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == wanted for candidate in header.split(","))
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set ``ETag`` and ``Cache-Control``; return a 304 if the client already has ``etag``.
+
+    Call before loading (collections) or serializing (single rows) so an
+    unchanged resource costs no query or serialization.
+    """
+    route = request.scope.get("route")
+    headers = {"ETag": etag, "Cache-Control": cache_control(getattr(route, "path", request.url.path))}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
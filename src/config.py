@@ -0,0 +1,71 @@
+import dataclasses
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+ENV_PREFIX = "IGORA_"
+
+
+def _parse(raw: str, kind: type):
+    if kind is bool:
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    return kind(raw)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Runtime configuration, read from ``IGORA_<FIELD_NAME>`` environment variables."""
+
+    database_url: str = "mysql+aiomysql://root:@localhost/igora"
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_prewarm: int = 5
+    replica_database_url: str = ""
+    read_your_writes_seconds: float = 5.0
+    bulk_chunk_size: int = 500
+    bulk_max_items: int = 10000
+    cache_ttl_seconds: float = 300.0
+    cache_max_entries: int = 256
+    availability_refresh_seconds: float = 60.0
+    order_number_block_size: int = 50
+    reports_ttl_seconds: int = 3600
+    reports_user_id: int = 1
+    fast_json: bool = False
+    auth_required: bool = False
+    session_duration_minutes: int = 150
+    session_flush_seconds: float = 30.0
+    session_cache_seconds: float = 5.0
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+    login_history_batch_size: int = 200
+    login_history_flush_seconds: float = 1.0
+    login_history_max_queue: int = 10000
+    login_history_overflow: str = "drop_newest"
+    client_search_fuzzy: bool = True
+    client_search_refresh_seconds: float = 600.0
+    slow_request_seconds: float = 1.0
+    cache_control: str = ""
+    etag_max_age_seconds: float = 10.0
+    coalesce_reads: bool = True
+    archive_after_days: int = 365
+    archive_batch_size: int = 200
+    archive_pause_seconds: float = 0.5
+    archive_interval_seconds: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        values = {}
+        for field in dataclasses.fields(cls):
+            raw = os.environ.get(ENV_PREFIX + field.name.upper())
+            if raw is not None:
+                values[field.name] = _parse(raw, type(field.default))
+        return cls(**values)
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings.from_env()
@@ -1,42 +1,185 @@
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.future import select
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
+import allocator
+import availability
+import cache
+import client_search
+import database
+import loader
 import models
 import schemas
-from typing import List, Optional
+import pagination
+import passwords
+from config import get_settings
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class OrderValidationError(ValueError):
+    pass
+
+
+class EquipmentUnavailable(Exception):
+    def __init__(self, equipment_ids: Sequence[int]):
+        super().__init__(f"Equipment is not available: {', '.join(map(str, equipment_ids))}")
+        self.equipment_ids = list(equipment_ids)
+
+
+class StockValidationError(ValueError):
+    pass
+
+
+class InsufficientStock(Exception):
+    def __init__(self, consumable_ids: Sequence[int]):
+        super().__init__(f"Not enough stock for consumables: {', '.join(map(str, consumable_ids))}")
+        self.consumable_ids = list(consumable_ids)
+
+
+class BulkInsertError(Exception):
+    def __init__(self, start: int, end: int, detail: str):
+        super().__init__(f"Insert failed for items {start}..{end - 1}: {detail}")
+        self.start = start
+        self.end = end
+        self.detail = detail
+
+
+def _error_detail(exc: DBAPIError) -> str:
+    return str(exc.orig) if exc.orig is not None else str(exc)
+
+
+async def _insert_rows(db: AsyncSession, model, rows: Sequence[dict]) -> List[int]:
+    pk = model.__mapper__.primary_key[0]
+    if db.bind.dialect.insert_executemany_returning:
+        # One multi-row INSERT ... RETURNING per page (SQLAlchemy "insertmanyvalues").
+        result = await db.execute(insert(model).returning(pk, sort_by_parameter_order=True), list(rows))
+        return list(result.scalars().all())
+    if len(rows) > 1 and db.bind.dialect.name == "mysql" and database.consecutive_insert_ids:
+        # MySQL has no RETURNING: send one INSERT ... VALUES (...), (...) instead.
+        # With innodb_autoinc_lock_mode 0 or 1 and auto_increment_increment = 1
+        # (checked at startup) its rows get consecutive ids from LAST_INSERT_ID(),
+        # which is the cursor's lastrowid. Otherwise fall through to one INSERT per row.
+        result = await db.execute(insert(model).values(list(rows)))
+        first_id = result.lastrowid
+        return list(range(first_id, first_id + len(rows)))
+    ids = []
+    for row in rows:
+        result = await db.execute(insert(model), row)
+        ids.append(result.inserted_primary_key[0])
+    return ids
+
+
+async def bulk_insert(
+    db: AsyncSession,
+    model,
+    rows: Sequence[dict],
+    chunk_size: int = 500,
+    continue_on_error: bool = False,
+    before_commit: Optional[Callable[[List[Optional[int]]], Awaitable[None]]] = None,
+) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+    """Insert ``rows`` in chunks inside one transaction and return their primary keys.
+
+    With ``continue_on_error`` a failing chunk is retried row by row under
+    savepoints; rows that still fail get a ``None`` id and an ``(index, detail)``
+    error entry. Otherwise the whole batch is rolled back and ``BulkInsertError``
+    is raised. ``before_commit(ids)`` runs in the same transaction after the inserts.
+    """
+    ids: List[Optional[int]] = [None] * len(rows)
+    errors: List[Tuple[int, str]] = []
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                async with db.begin_nested():
+                    ids[start:start + len(chunk)] = await _insert_rows(db, model, chunk)
+                continue
+            except DBAPIError as exc:
+                if not continue_on_error:
+                    raise BulkInsertError(start, start + len(chunk), _error_detail(exc))
+            for index, row in enumerate(chunk, start):
+                try:
+                    async with db.begin_nested():
+                        ids[index] = (await _insert_rows(db, model, [row]))[0]
+                except DBAPIError as exc:
+                    errors.append((index, _error_detail(exc)))
+        if before_commit is not None:
+            await before_commit(ids)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    return ids, errors
+
+# Lookups by primary key go through the request's loader, so the ones issued
+# together are one IN (...) query and none repeats within a request.
+async def get_by_ids(db: AsyncSession, model, ids: Sequence[int]) -> list:
+    """Rows of ``model`` with these primary keys, in the order asked for; unknown ids are left out."""
+    rows = await loader.get(db, model).load_many(dict.fromkeys(ids))
+    return [row for row in rows if row is not None]
 
 # Roles
+@cache.cached("roles")
 async def get_role(db: AsyncSession, role_id: int) -> Optional[models.Role]:
-    result = await db.execute(select(models.Role).where(models.Role.role_id == role_id))
-    return result.scalars().first()
+    return await loader.get(db, models.Role).load(role_id)
 
-async def get_roles(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Role]:
-    result = await db.execute(select(models.Role).offset(skip).limit(limit))
+@cache.cached("roles")
+async def get_roles(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.Role]:
+    stmt = pagination.paginate(select(models.Role), models.Role.role_id, skip=skip, limit=limit, cursor=cursor)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 async def create_role(db: AsyncSession, role: schemas.RoleCreate) -> models.Role:
-    db_role = models.Role(**role.dict())
+    db_role = models.Role(**role.model_dump())
     db.add(db_role)
     await db.commit()
     await db.refresh(db_role)
+    cache.invalidate("roles")
     return db_role
 
 # Users
 async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
-    result = await db.execute(select(models.User).where(models.User.user_id == user_id))
-    return result.scalars().first()
+    return await loader.get(db, models.User).load(user_id)
 
 async def get_user_by_login(db: AsyncSession, login: str) -> Optional[models.User]:
     result = await db.execute(select(models.User).where(models.User.login == login))
     return result.scalars().first()
 
-async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.User]:
-    result = await db.execute(select(models.User).offset(skip).limit(limit))
+async def authenticate_user(db: AsyncSession, login: str, password: str) -> Optional[models.User]:
+    db_user = await get_user_by_login(db, login)
+    if db_user is None:
+        await passwords.hasher.verify(password, passwords.DUMMY_HASH)
+        return None
+    matches, needs_rehash = await passwords.hasher.verify(password, db_user.password_hash)
+    if not matches or db_user.is_active is False:
+        return None
+    if needs_rehash:
+        # Best effort: the password was right, so a busy hasher must not fail the login.
+        try:
+            db_user.password_hash = await passwords.hasher.hash(password)
+        except passwords.PasswordHasherBusy:
+            logger.warning("Hasher busy; password of user %s stays on its old hash until the next login", db_user.user_id)
+        else:
+            await db.commit()
+    return db_user
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.User]:
+    stmt = pagination.paginate(select(models.User), models.User.user_id, skip=skip, limit=limit, cursor=cursor)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User:
     db_user = models.User(
         login=user.login,
-        password_hash=user.password,  # TODO: hash password properly
+        password_hash=await passwords.hasher.hash(user.password),
         first_name=user.first_name,
         last_name=user.last_name,
         middle_name=user.middle_name,
@@ -49,84 +192,787 @@ async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User
     await db.refresh(db_user)
     return db_user
 
+# Sessions
+async def create_user_session(db: AsyncSession, session_id: str, user_id: int, duration_minutes: int) -> models.SessionManagement:
+    now = datetime.now()
+    db_session = models.SessionManagement(
+        session_id=session_id,
+        user_id=user_id,
+        login_time=now,
+        last_activity=now,
+        session_duration_minutes=duration_minutes,
+        is_active=True,
+    )
+    db.add(db_session)
+    await db.commit()
+    return db_session
+
+async def get_user_session(db: AsyncSession, session_id: str) -> Optional[models.SessionManagement]:
+    result = await db.execute(
+        select(models.SessionManagement)
+        .where(models.SessionManagement.session_id == session_id, models.SessionManagement.is_active.is_(True))
+    )
+    return result.scalars().first()
+
+async def close_user_session(db: AsyncSession, session_id: str) -> None:
+    await db.execute(
+        update(models.SessionManagement)
+        .where(models.SessionManagement.session_id == session_id)
+        .values(is_active=False, logout_time=datetime.now())
+    )
+    await db.commit()
+
+async def touch_user_sessions(db: AsyncSession, activity: Dict[str, datetime]) -> None:
+    """Write ``last_activity`` for many sessions as one executemany."""
+    table = models.SessionManagement.__table__
+    await db.execute(
+        table.update()
+        .where(table.c.session_id == bindparam("b_session_id"), table.c.is_active.is_(True))
+        .values(last_activity=bindparam("b_last_activity")),
+        [{"b_session_id": session_id, "b_last_activity": at} for session_id, at in activity.items()],
+    )
+    await db.commit()
+
 # Clients
 async def get_client(db: AsyncSession, client_id: int) -> Optional[models.Client]:
-    result = await db.execute(select(models.Client).where(models.Client.client_id == client_id))
-    return result.scalars().first()
+    return await loader.get(db, models.Client).load(client_id)
 
-async def get_clients(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Client]:
-    result = await db.execute(select(models.Client).offset(skip).limit(limit))
+# Sort keys besides the primary key; each is the leading column of an index.
+CLIENT_SORTS = {"last_name": models.Client.last_name, "client_code": models.Client.client_code}
+
+def clients_query(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "client_id",
+    last_name: Optional[str] = None,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+):
+    stmt = select(models.Client)
+    if last_name is not None:
+        stmt = stmt.where(models.Client.last_name == last_name)
+    if phone is not None:
+        stmt = stmt.where(models.Client.phone == phone)
+    if email is not None:
+        stmt = stmt.where(models.Client.email == email)
+    return pagination.paginate(
+        stmt, models.Client.client_id, skip=skip, limit=limit, cursor=cursor, sort=sort, sort_columns=CLIENT_SORTS
+    )
+
+async def get_clients(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, **filters) -> List[models.Client]:
+    result = await db.execute(clients_query(skip, limit, cursor, **filters))
     return result.scalars().all()
 
 async def create_client(db: AsyncSession, client: schemas.ClientCreate) -> models.Client:
-    db_client = models.Client(**client.dict())
+    db_client = models.Client(**client.model_dump())
     db.add(db_client)
     await db.commit()
     await db.refresh(db_client)
+    client_search.index.add(
+        db_client.client_id, db_client.last_name, db_client.first_name, db_client.middle_name, db_client.phone
+    )
     return db_client
 
+async def create_clients_bulk(
+    db: AsyncSession, clients: List[schemas.ClientCreate], chunk_size: int = 500, continue_on_error: bool = False
+) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+    rows = [client.model_dump() for client in clients]
+    ids, errors = await bulk_insert(db, models.Client, rows, chunk_size, continue_on_error)
+    for row, client_id in zip(rows, ids):
+        if client_id is not None:
+            client_search.index.add(client_id, row["last_name"], row["first_name"], row["middle_name"], row["phone"])
+    return ids, errors
+
+def _like_prefix(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _client_prefix_queries(q: str) -> List[Tuple[object, object]]:
+    """``(condition, exact)`` pairs for ``q``, each answerable from one index."""
+    client = models.Client
+    if "@" in q:
+        return [(client.email.like(_like_prefix(q), escape="\\"), client.email == q)]
+    if client_search.is_phone_query(q):
+        return [
+            (client.phone.like(_like_prefix(q), escape="\\"), client.phone == q),
+            (client.client_code.like(_like_prefix(q), escape="\\"), client.client_code == q),
+        ]
+    words = q.split()
+    if len(words) > 1:
+        # "Иванов Пе" -> idx_clients_name (last_name, first_name)
+        return [(
+            (client.last_name == words[0]) & client.first_name.like(_like_prefix(words[1]), escape="\\"),
+            (client.last_name == words[0]) & (client.first_name == words[1]),
+        )]
+    return [
+        (client.last_name.like(_like_prefix(q), escape="\\"), client.last_name == q),
+        (client.email.like(_like_prefix(q), escape="\\"), client.email == q),
+        (client.client_code.like(_like_prefix(q), escape="\\"), client.client_code == q),
+    ]
+
+async def load_client_search(db: AsyncSession):
+    client = models.Client
+    result = await db.execute(
+        select(client.client_id, client.last_name, client.first_name, client.middle_name, client.phone)
+    )
+    return result.all()
+
+async def search_clients(db: AsyncSession, q: str, limit: int = 20, fuzzy: bool = True) -> List[models.Client]:
+    """Clients matching ``q``, best first.
+
+    Exact matches rank above prefix matches, which come from the
+    ``Clients`` indexes and rank above fuzzy matches from the trigram index.
+    The trigram index is consulted only when the prefix queries return fewer
+    than ``limit`` clients.
+    """
+    q = q.strip()
+    if not q:
+        return []
+    scores: Dict[int, float] = {}
+    found: Dict[int, models.Client] = {}
+    for condition, exact in _client_prefix_queries(q):
+        result = await db.execute(
+            select(models.Client, exact.label("exact")).where(condition).order_by(models.Client.client_id).limit(limit)
+        )
+        for db_client, is_exact in result:
+            found[db_client.client_id] = db_client
+            scores[db_client.client_id] = max(scores.get(db_client.client_id, 0), 3.0 if is_exact else 2.0)
+
+    if fuzzy and get_settings().client_search_fuzzy and len(scores) < limit:
+        await client_search.index.ensure_fresh(lambda: load_client_search(db))
+        for client_id, score in client_search.index.search(q, limit):
+            scores.setdefault(client_id, score)
+        missing = [client_id for client_id in scores if client_id not in found]
+        if missing:
+            result = await db.execute(select(models.Client).where(models.Client.client_id.in_(missing)))
+            found.update((db_client.client_id, db_client) for db_client in result.scalars())
+
+    ranked = sorted(
+        (client_id for client_id in scores if client_id in found),
+        key=lambda client_id: (-scores[client_id], found[client_id].last_name, found[client_id].first_name, client_id),
+    )
+    return [found[client_id] for client_id in ranked[:limit]]
+
 # Similar CRUD functions can be added for EquipmentCategory, Equipment, Service, Order, OrderService, EquipmentReturn, Consumable, ConsumableTransaction
 
 # Equipment Categories
+@cache.cached("equipment_categories")
 async def get_equipment_category(db: AsyncSession, category_id: int) -> Optional[models.EquipmentCategory]:
-    result = await db.execute(select(models.EquipmentCategory).where(models.EquipmentCategory.category_id == category_id))
-    return result.scalars().first()
+    return await loader.get(db, models.EquipmentCategory).load(category_id)
 
-async def get_equipment_categories(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.EquipmentCategory]:
-    result = await db.execute(select(models.EquipmentCategory).offset(skip).limit(limit))
+@cache.cached("equipment_categories")
+async def get_equipment_categories(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.EquipmentCategory]:
+    stmt = pagination.paginate(select(models.EquipmentCategory), models.EquipmentCategory.category_id, skip=skip, limit=limit, cursor=cursor)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 async def create_equipment_category(db: AsyncSession, category: schemas.EquipmentCategoryCreate) -> models.EquipmentCategory:
-    db_category = models.EquipmentCategory(**category.dict())
+    db_category = models.EquipmentCategory(**category.model_dump())
     db.add(db_category)
     await db.commit()
     await db.refresh(db_category)
+    cache.invalidate("equipment_categories")
     return db_category
 
 # Equipment
 async def get_equipment_item(db: AsyncSession, equipment_id: int) -> Optional[models.Equipment]:
-    result = await db.execute(select(models.Equipment).where(models.Equipment.equipment_id == equipment_id))
-    return result.scalars().first()
+    return await loader.get(db, models.Equipment).load(equipment_id)
+
+EQUIPMENT_SORTS = {"category_id": models.Equipment.category_id}
+
+def equipment_query(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "equipment_id",
+    category_id: Optional[int] = None,
+    is_available: Optional[bool] = None,
+    condition_status: Optional[str] = None,
+    size: Optional[str] = None,
+):
+    stmt = select(models.Equipment)
+    if category_id is not None:
+        stmt = stmt.where(models.Equipment.category_id == category_id)
+    if is_available is not None:
+        stmt = stmt.where(models.Equipment.is_available == is_available)
+    if condition_status is not None:
+        stmt = stmt.where(models.Equipment.condition_status == models.EquipmentConditionStatus(condition_status))
+    if size is not None:
+        stmt = stmt.where(models.Equipment.size == size)
+    return pagination.paginate(
+        stmt, models.Equipment.equipment_id, skip=skip, limit=limit, cursor=cursor, sort=sort, sort_columns=EQUIPMENT_SORTS
+    )
+
+async def get_equipment(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, **filters) -> List[models.Equipment]:
+    result = await db.execute(equipment_query(skip, limit, cursor, **filters))
+    return result.scalars().all()
 
-async def get_equipment(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Equipment]:
-    result = await db.execute(select(models.Equipment).offset(skip).limit(limit))
+async def get_equipment_by_ids(db: AsyncSession, equipment_ids: Sequence[int]) -> List[models.Equipment]:
+    if not equipment_ids:
+        return []
+    result = await db.execute(
+        select(models.Equipment)
+        .where(models.Equipment.equipment_id.in_(equipment_ids))
+        .order_by(models.Equipment.equipment_id)
+    )
     return result.scalars().all()
 
+def _is_rentable(condition) -> bool:
+    return getattr(condition, "value", condition) != models.EquipmentConditionStatus.needs_repair.value
+
 async def create_equipment(db: AsyncSession, equipment: schemas.EquipmentCreate) -> models.Equipment:
-    db_equipment = models.Equipment(**equipment.dict())
+    db_equipment = models.Equipment(**equipment.model_dump())
     db.add(db_equipment)
     await db.commit()
     await db.refresh(db_equipment)
+    availability.index.add_equipment(
+        db_equipment.equipment_id, db_equipment.category_id, db_equipment.size,
+        _is_rentable(db_equipment.condition_status),
+    )
     return db_equipment
 
+async def create_equipment_bulk(
+    db: AsyncSession, equipment: List[schemas.EquipmentCreate], chunk_size: int = 500, continue_on_error: bool = False
+) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+    rows = [item.model_dump() for item in equipment]
+    ids, errors = await bulk_insert(db, models.Equipment, rows, chunk_size, continue_on_error)
+    for equipment_id, item in zip(ids, equipment):
+        if equipment_id is not None:
+            availability.index.add_equipment(equipment_id, item.category_id, item.size, _is_rentable(item.condition_status))
+    return ids, errors
+
+async def load_availability(db: AsyncSession):
+    items = await db.execute(
+        select(
+            models.Equipment.equipment_id,
+            models.Equipment.category_id,
+            models.Equipment.size,
+            models.Equipment.condition_status,
+        )
+    )
+    bookings = await db.execute(
+        select(
+            models.Order.order_id,
+            models.OrderService.equipment_id,
+            models.Order.start_date,
+            models.Order.end_date,
+        )
+        .join(models.OrderService, models.OrderService.order_id == models.Order.order_id)
+        .outerjoin(
+            models.EquipmentReturn,
+            (models.EquipmentReturn.order_id == models.Order.order_id)
+            & (models.EquipmentReturn.equipment_id == models.OrderService.equipment_id),
+        )
+        .where(
+            models.Order.status == models.OrderStatus.active,
+            models.OrderService.equipment_id.is_not(None),
+            models.EquipmentReturn.return_id.is_(None),
+        )
+    )
+    return (
+        [(row.equipment_id, row.category_id, row.size, _is_rentable(row.condition_status)) for row in items],
+        bookings.all(),
+    )
+
+async def get_active_order_for_equipment(db: AsyncSession, equipment_id: int) -> Optional[models.Order]:
+    """The active order the item is out on and not yet returned from, if any."""
+    result = await db.execute(
+        select(models.Order)
+        .join(models.OrderService, models.OrderService.order_id == models.Order.order_id)
+        .outerjoin(
+            models.EquipmentReturn,
+            (models.EquipmentReturn.order_id == models.Order.order_id)
+            & (models.EquipmentReturn.equipment_id == models.OrderService.equipment_id),
+        )
+        .where(
+            models.OrderService.equipment_id == equipment_id,
+            models.Order.status == models.OrderStatus.active,
+            models.EquipmentReturn.return_id.is_(None),
+        )
+        .order_by(models.Order.start_date.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
 # Services
+@cache.cached("services")
 async def get_service(db: AsyncSession, service_id: int) -> Optional[models.Service]:
-    result = await db.execute(select(models.Service).where(models.Service.service_id == service_id))
-    return result.scalars().first()
+    return await loader.get(db, models.Service).load(service_id)
 
-async def get_services(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Service]:
-    result = await db.execute(select(models.Service).offset(skip).limit(limit))
+@cache.cached("services")
+async def get_services(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.Service]:
+    stmt = pagination.paginate(select(models.Service), models.Service.service_id, skip=skip, limit=limit, cursor=cursor)
+    result = await db.execute(stmt)
     return result.scalars().all()
 
 async def create_service(db: AsyncSession, service: schemas.ServiceCreate) -> models.Service:
-    db_service = models.Service(**service.dict())
+    db_service = models.Service(**service.model_dump())
     db.add(db_service)
     await db.commit()
     await db.refresh(db_service)
+    cache.invalidate("services")
     return db_service
 
 # Orders
-async def get_order(db: AsyncSession, order_id: int) -> Optional[models.Order]:
-    result = await db.execute(select(models.Order).where(models.Order.order_id == order_id))
+ORDER_EXPANSIONS = ("client", "user", "lines", "lines.service", "lines.equipment")
+
+def parse_order_expand(expand: Optional[str]) -> Set[str]:
+    """Parse ``expand=client,lines.service`` into a set; nested paths imply their parent."""
+    if not expand:
+        return set()
+    requested = {part.strip() for part in expand.split(",") if part.strip()}
+    unknown = requested.difference(ORDER_EXPANSIONS)
+    if unknown:
+        raise ValueError(f"Unknown expansions: {', '.join(sorted(unknown))}")
+    return requested | {path.split(".")[0] for path in requested}
+
+def order_load_options(expand: Iterable[str], model=models.Order) -> list:
+    # Many-to-one relations are joined into the order query; lines take one
+    # more SELECT ... IN for the whole page, joined to their service/equipment.
+    line_model = model.lines.property.mapper.class_
+    options = []
+    if "client" in expand:
+        options.append(joinedload(model.client))
+    if "user" in expand:
+        options.append(joinedload(model.user))
+    if "lines" in expand:
+        options.append(selectinload(model.lines))
+    if "lines.service" in expand:
+        options.append(selectinload(model.lines).joinedload(line_model.service))
+    if "lines.equipment" in expand:
+        options.append(selectinload(model.lines).joinedload(line_model.equipment))
+    return options
+
+async def get_orders_by_ids(db: AsyncSession, order_ids: Sequence[int], expand: Iterable[str] = ()) -> list:
+    """Orders in the requested order; ids missing from ``Orders`` are looked up in the archive."""
+    wanted = list(dict.fromkeys(order_ids))
+    if not wanted:
+        return []
+    found = {}
+    for model in (models.Order, models.ArchivedOrder):
+        missing = [order_id for order_id in wanted if order_id not in found]
+        if not missing:
+            break
+        result = await db.execute(select(model).where(model.order_id.in_(missing)).options(*order_load_options(expand, model)))
+        found.update((db_order.order_id, db_order) for db_order in result.scalars())
+    return [found[order_id] for order_id in wanted if order_id in found]
+
+async def get_order(db: AsyncSession, order_id: int, expand: Iterable[str] = ()) -> Optional[models.Order]:
+    result = await db.execute(
+        select(models.Order).where(models.Order.order_id == order_id).options(*order_load_options(expand))
+    )
     return result.scalars().first()
 
-async def get_orders(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Order]:
-    result = await db.execute(select(models.Order).offset(skip).limit(limit))
-    return result.scalars().all()
+async def get_order_or_archived(
+    db: AsyncSession, order_id: int, expand: Iterable[str] = ()
+) -> Optional[Union[models.Order, models.ArchivedOrder]]:
+    """The order from ``Orders``, or its read-only copy once it has been archived."""
+    db_order = await get_order(db, order_id, expand)
+    if db_order is not None:
+        return db_order
+    result = await db.execute(
+        select(models.ArchivedOrder)
+        .where(models.ArchivedOrder.order_id == order_id)
+        .options(*order_load_options(expand, models.ArchivedOrder))
+    )
+    return result.scalars().first()
+
+ORDER_SORTS = {"order_date": models.Order.order_date}
+
+def orders_query(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "order_id",
+    status: Optional[str] = None,
+    client_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Orders matching every given filter; ``order_date`` is in ``[date_from, date_to)``.
+
+    Filters are plain equality and range predicates so that idx_orders_status,
+    idx_orders_client / idx_orders_user (with the date range) and
+    idx_orders_date can serve them.
+    """
+    stmt = select(models.Order)
+    if status is not None:
+        stmt = stmt.where(models.Order.status == models.OrderStatus(status))
+    if client_id is not None:
+        stmt = stmt.where(models.Order.client_id == client_id)
+    if user_id is not None:
+        stmt = stmt.where(models.Order.user_id == user_id)
+    if date_from is not None:
+        stmt = stmt.where(models.Order.order_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(models.Order.order_date < date_to)
+    return pagination.paginate(
+        stmt, models.Order.order_id, skip=skip, limit=limit, cursor=cursor, sort=sort, sort_columns=ORDER_SORTS
+    )
+
+async def get_orders(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "order_id",
+    expand: Iterable[str] = (),
+    **filters,
+) -> List[models.Order]:
+    stmt = orders_query(skip, limit, cursor, sort, **filters).options(*order_load_options(expand))
+    result = await db.execute(stmt)
+    return result.scalars().unique().all()
 
 async def create_order(db: AsyncSession, order: schemas.OrderCreate) -> models.Order:
-    db_order = models.Order(**order.dict())
+    order_number, barcode = await allocator.allocate_order_identifiers(
+        order.order_number, order.barcode, rental_hours(order.start_date, order.end_date)
+    )
+    db_order = models.Order(**order.model_dump(exclude={"order_number", "barcode"}), order_number=order_number, barcode=barcode)
     db.add(db_order)
     await db.commit()
     await db.refresh(db_order)
     return db_order
+
+def _unreturned_equipment():
+    """Equipment ids on order lines that have no return yet."""
+    return (
+        select(models.OrderService.equipment_id)
+        .outerjoin(
+            models.EquipmentReturn,
+            (models.EquipmentReturn.order_id == models.OrderService.order_id)
+            & (models.EquipmentReturn.equipment_id == models.OrderService.equipment_id),
+        )
+        .where(models.OrderService.equipment_id.is_not(None), models.EquipmentReturn.return_id.is_(None))
+    )
+
+async def _release_equipment(db: AsyncSession, order_id: int) -> None:
+    # Only tr_return_equipment sets is_available back; an order closed without
+    # returns frees its items here, unless another active order still has them out.
+    on_order = _unreturned_equipment().where(models.OrderService.order_id == order_id)
+    elsewhere = (
+        _unreturned_equipment()
+        .join(models.Order, models.Order.order_id == models.OrderService.order_id)
+        .where(models.Order.status == models.OrderStatus.active, models.Order.order_id != order_id)
+    )
+    await db.execute(
+        update(models.Equipment)
+        .where(models.Equipment.equipment_id.in_(on_order), models.Equipment.equipment_id.not_in(elsewhere))
+        .values(is_available=True)
+    )
+
+async def update_order_status(db: AsyncSession, order_id: int, status: schemas.OrderStatus) -> Optional[models.Order]:
+    db_order = await get_order(db, order_id)
+    if db_order is None:
+        return None
+    was_active = db_order.status == models.OrderStatus.active
+    db_order.status = status
+    if was_active and models.OrderStatus(status) != models.OrderStatus.active:
+        await _release_equipment(db, order_id)
+    await db.commit()
+    await db.refresh(db_order)
+    if db_order.status == models.OrderStatus.active:
+        await _book_orders(db, [order_id])
+    else:
+        availability.index.release_order(order_id)
+    return db_order
+
+CENT = Decimal("0.01")
+
+def rental_hours(start, end) -> int:
+    return max(1, math.ceil((end - start).total_seconds() / 3600))
+
+def price_line(service: models.Service, hours: int, quantity: int) -> Tuple[Decimal, Decimal]:
+    """Price one line: the cheaper of hourly and whole-day billing, per unit and in total."""
+    unit_price = Decimal(service.hourly_rate) * hours
+    if service.daily_rate is not None:
+        unit_price = min(unit_price, Decimal(service.daily_rate) * math.ceil(hours / 24))
+    unit_price = unit_price.quantize(CENT, ROUND_HALF_UP)
+    return unit_price, unit_price * quantity
+
+async def create_order_full(db: AsyncSession, order: schemas.OrderFullCreate) -> Tuple[models.Order, List[dict]]:
+    """Create an order with its lines in one transaction.
+
+    Lines are priced from the current service rates and the order totals are
+    computed once here and written with the order (there is no per-line total
+    trigger, see docs/migrations/001_order_totals_from_app.sql). Equipment is reserved for the order's window: the item
+    rows are locked, then checked for active, unreturned lines that overlap it,
+    so two counters cannot book the same item for the same time. If any item is
+    taken, the whole order is rolled back with ``EquipmentUnavailable``.
+    """
+    if order.end_date <= order.start_date:
+        raise OrderValidationError("end_date must be later than start_date")
+    equipment_ids = [line.equipment_id for line in order.lines if line.equipment_id is not None]
+    if len(equipment_ids) != len(set(equipment_ids)):
+        raise OrderValidationError("The same equipment item is listed more than once")
+    default_hours = rental_hours(order.start_date, order.end_date)
+    # Allocated before this transaction writes anything, since the allocator commits on its own connection.
+    order_number, barcode = await allocator.allocate_order_identifiers(order.order_number, order.barcode, default_hours)
+
+    try:
+        if equipment_ids:
+            # Lock first, before any plain read: a concurrent order for the same items
+            # waits here until this one commits, and its overlap check (whose InnoDB
+            # snapshot is only taken after the lock) then sees these lines.
+            result = await db.execute(
+                select(models.Equipment.equipment_id, models.Equipment.condition_status)
+                .where(models.Equipment.equipment_id.in_(equipment_ids))
+                .with_for_update()
+            )
+            conditions = {row.equipment_id: row.condition_status for row in result}
+            unknown = [equipment_id for equipment_id in equipment_ids if equipment_id not in conditions]
+            if unknown:
+                raise OrderValidationError(f"Unknown equipment: {', '.join(map(str, unknown))}")
+            rentable = {equipment_id for equipment_id, condition in conditions.items() if _is_rentable(condition)}
+            result = await db.execute(
+                _unreturned_equipment()
+                .join(models.Order, models.Order.order_id == models.OrderService.order_id)
+                .where(
+                    models.OrderService.equipment_id.in_(equipment_ids),
+                    models.Order.status == models.OrderStatus.active,
+                    models.Order.start_date < availability.naive(order.end_date),
+                    models.Order.end_date > availability.naive(order.start_date),
+                )
+            )
+            booked = set(result.scalars())
+            unavailable = [
+                equipment_id for equipment_id in equipment_ids if equipment_id not in rentable or equipment_id in booked
+            ]
+            if unavailable:
+                raise EquipmentUnavailable(unavailable)
+
+        service_ids = {line.service_id for line in order.lines}
+        result = await db.execute(select(models.Service).where(models.Service.service_id.in_(service_ids)))
+        services = {service.service_id: service for service in result.scalars()}
+        missing = sorted(service_id for service_id in service_ids
+                         if service_id not in services or services[service_id].is_active is False)
+        if missing:
+            raise OrderValidationError(f"Unknown or inactive services: {', '.join(map(str, missing))}")
+
+        lines = []
+        total_amount = Decimal(0)
+        deposit_amount = Decimal(0)
+        for line in order.lines:
+            service = services[line.service_id]
+            hours = line.rental_hours or default_hours
+            unit_price, total_price = price_line(service, hours, line.quantity)
+            total_amount += total_price
+            deposit_amount += Decimal(service.deposit_amount or 0) * line.quantity
+            lines.append(dict(
+                service_id=line.service_id,
+                equipment_id=line.equipment_id,
+                quantity=line.quantity,
+                unit_price=unit_price,
+                total_price=total_price,
+                rental_hours=hours,
+                notes=line.notes,
+            ))
+
+        db_order = models.Order(
+            **order.model_dump(exclude={"lines", "order_number", "barcode"}),
+            order_number=order_number,
+            barcode=barcode,
+            total_amount=total_amount,
+            deposit_amount=deposit_amount,
+            status=models.OrderStatus.active,
+        )
+        db.add(db_order)
+        await db.flush()
+        for line in lines:
+            line["order_id"] = db_order.order_id
+        for line, line_id in zip(lines, await _insert_rows(db, models.OrderService, lines)):
+            line["order_service_id"] = line_id
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    await db.refresh(db_order)
+
+    for equipment_id in equipment_ids:
+        availability.index.book(db_order.order_id, equipment_id, db_order.start_date, db_order.end_date)
+    return db_order, lines
+
+async def _book_orders(db: AsyncSession, order_ids: Sequence[int]) -> None:
+    """Add the equipment lines of active ``order_ids`` to the availability index."""
+    if not order_ids:
+        return
+    result = await db.execute(
+        select(models.Order.order_id, models.OrderService.equipment_id, models.Order.start_date, models.Order.end_date)
+        .join(models.OrderService, models.OrderService.order_id == models.Order.order_id)
+        .where(
+            models.Order.order_id.in_(order_ids),
+            models.Order.status == models.OrderStatus.active,
+            models.OrderService.equipment_id.is_not(None),
+        )
+    )
+    for row in result:
+        availability.index.book(row.order_id, row.equipment_id, row.start_date, row.end_date)
+
+# Barcodes
+SCAN_EQUIPMENT = "equipment"
+SCAN_ORDER = "order"
+
+async def resolve_barcode(db: AsyncSession, barcode: str) -> Optional[Tuple[str, int]]:
+    """``(kind, id)`` of the equipment item or order with ``barcode``.
+
+    Order barcodes have a recognisable layout (see ``allocator.parse_order_barcode``),
+    so those are looked up in ``Orders`` first and everything else in
+    ``Equipment`` first. Resolutions are cached: barcodes never move to
+    another row, and the same code is scanned several times per checkout.
+    """
+    scans = cache.get_cache("scan")
+    resolved = scans.get(barcode)
+    if resolved is not None:
+        return resolved
+    lookups = [
+        (SCAN_EQUIPMENT, models.Equipment.equipment_id, models.Equipment.barcode),
+        (SCAN_ORDER, models.Order.order_id, models.Order.barcode),
+    ]
+    if allocator.parse_order_barcode(barcode) is not None:
+        lookups.reverse()
+    # Archived orders keep their id, so the cached resolution stays valid.
+    lookups.append((SCAN_ORDER, models.ArchivedOrder.order_id, models.ArchivedOrder.barcode))
+    for kind, pk, column in lookups:
+        result = await db.execute(select(pk).where(column == barcode))
+        found = result.scalar()
+        if found is not None:
+            scans.set(barcode, (kind, found))
+            return kind, found
+    return None
+
+# Order Services
+async def _recalculate_order_totals(db: AsyncSession, order_ids: Iterable[int]) -> None:
+    # Orders.total_amount is kept by the app, once per order per write, not by a per-line trigger.
+    order_ids = sorted(order_ids)
+    if not order_ids:
+        return
+    line_totals = (
+        select(func.coalesce(func.sum(models.OrderService.total_price), 0))
+        .where(models.OrderService.order_id == models.Order.order_id)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(models.Order).where(models.Order.order_id.in_(order_ids)).values(total_amount=line_totals)
+    )
+
+async def create_order_services_bulk(
+    db: AsyncSession, lines: List[schemas.OrderServiceCreate], chunk_size: int = 500, continue_on_error: bool = False
+) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+    rows = [line.model_dump() for line in lines]
+
+    async def update_totals(ids: List[Optional[int]]) -> None:
+        await _recalculate_order_totals(db, {line.order_id for line, line_id in zip(lines, ids) if line_id is not None})
+
+    ids, errors = await bulk_insert(db, models.OrderService, rows, chunk_size, continue_on_error, update_totals)
+    await _book_orders(db, sorted({line.order_id for line, line_id in zip(lines, ids) if line_id is not None}))
+    return ids, errors
+
+# Equipment Returns
+async def create_equipment_return(db: AsyncSession, equipment_return: schemas.EquipmentReturnCreate) -> models.EquipmentReturn:
+    db_return = models.EquipmentReturn(**equipment_return.model_dump())
+    db.add(db_return)
+    await db.flush()
+    # tr_return_equipment completes the whole order but only frees the returned
+    # item; free the order's other items too, so the flag matches the index.
+    await _release_equipment(db, db_return.order_id)
+    await db.commit()
+    await db.refresh(db_return)
+    availability.index.release_order(db_return.order_id)
+    return db_return
+
+# Consumables
+async def get_consumable(db: AsyncSession, consumable_id: int) -> Optional[models.Consumable]:
+    return await loader.get(db, models.Consumable).load(consumable_id)
+
+async def get_consumables(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.Consumable]:
+    stmt = pagination.paginate(select(models.Consumable), models.Consumable.consumable_id, skip=skip, limit=limit, cursor=cursor)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def get_low_stock_consumables(db: AsyncSession) -> List[models.Consumable]:
+    # current_stock is kept up to date by every transaction, so this never reads the ledger.
+    result = await db.execute(
+        select(models.Consumable)
+        .where(models.Consumable.is_active.is_not(False), models.Consumable.current_stock < models.Consumable.minimum_stock)
+        .order_by(models.Consumable.consumable_id)
+    )
+    return result.scalars().all()
+
+async def create_consumable(db: AsyncSession, consumable: schemas.ConsumableCreate) -> models.Consumable:
+    db_consumable = models.Consumable(**consumable.model_dump(), last_updated=datetime.now())
+    db.add(db_consumable)
+    await db.commit()
+    await db.refresh(db_consumable)
+    return db_consumable
+
+# Consumable Transactions
+async def get_consumable_transactions(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "transaction_id",
+    consumable_id: Optional[int] = None,
+) -> List[models.ConsumableTransaction]:
+    stmt = select(models.ConsumableTransaction)
+    if consumable_id is not None:
+        stmt = stmt.where(models.ConsumableTransaction.consumable_id == consumable_id)
+    stmt = pagination.paginate(
+        stmt, models.ConsumableTransaction.transaction_id,
+        skip=skip, limit=limit, cursor=cursor,
+        sort=sort, sort_columns={"transaction_date": models.ConsumableTransaction.transaction_date},
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+def stock_delta(transaction_type, quantity: Decimal) -> Decimal:
+    return quantity if transaction_type == schemas.ConsumableTransactionType.receipt else -quantity
+
+async def create_consumable_transactions(
+    db: AsyncSession, transactions: List[schemas.ConsumableTransactionCreate]
+) -> List[dict]:
+    """Record ``transactions`` and apply them to ``current_stock`` in one database transaction.
+
+    Each consumable gets a single conditional ``UPDATE`` with the net change of
+    the batch, so stock is never read into Python and concurrent postings
+    cannot overwrite each other. Rows are updated in ``consumable_id`` order
+    to keep lock order stable across batches. If any item lacks stock or does
+    not exist, nothing is written.
+    """
+    deltas = defaultdict(Decimal)
+    for transaction in transactions:
+        deltas[transaction.consumable_id] += stock_delta(transaction.transaction_type, transaction.quantity)
+
+    now = datetime.now()
+    consumable = models.Consumable
+    try:
+        failed = []
+        for consumable_id in sorted(deltas):
+            delta = deltas[consumable_id]
+            stmt = (
+                update(consumable)
+                .where(consumable.consumable_id == consumable_id)
+                .values(current_stock=consumable.current_stock + delta, last_updated=now)
+            )
+            if delta < 0:
+                stmt = stmt.where(consumable.current_stock >= -delta)
+            result = await db.execute(stmt)
+            if result.rowcount != 1:
+                failed.append(consumable_id)
+        if failed:
+            await db.rollback()
+            result = await db.execute(select(consumable.consumable_id).where(consumable.consumable_id.in_(failed)))
+            existing = set(result.scalars())
+            missing = [consumable_id for consumable_id in failed if consumable_id not in existing]
+            if missing:
+                raise StockValidationError(f"Unknown consumables: {', '.join(map(str, missing))}")
+            raise InsufficientStock(failed)
+
+        rows = [dict(transaction.model_dump(), transaction_date=now) for transaction in transactions]
+        for row, transaction_id in zip(rows, await _insert_rows(db, models.ConsumableTransaction, rows)):
+            row["transaction_id"] = transaction_id
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    return rows
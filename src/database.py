@@ -1,13 +1,216 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import time
+from typing import Dict, Optional
 
-DATABASE_URL = "mysql+aiomysql://root:@localhost/igora"
+from fastapi import Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
-async_session = sessionmaker(
-    engine, expire_on_commit=False, class_=AsyncSession
-)
+import cache
+import conditional
+import metrics
+from config import Settings
 
-async def get_session() -> AsyncSession:
+# Requests carrying this header, or this cookie with a future timestamp, read from the primary.
+READ_PRIMARY_HEADER = "X-Read-Primary"
+READ_PRIMARY_COOKIE = "igora_read_primary_until"
+_STATEMENT_STARTS = "igora_statement_starts"
+_WRITTEN_TABLES = "igora_written_tables"
+_COMMITTED_TABLES = "igora_committed_tables"
+
+engine: Optional[AsyncEngine] = None
+async_session: Optional[async_sessionmaker] = None
+replica_engine: Optional[AsyncEngine] = None
+replica_session: Optional[async_sessionmaker] = None
+read_your_writes_seconds: float = 0.0
+# Set at startup: whether one multi-row INSERT on the primary gets consecutive AUTO_INCREMENT ids.
+consecutive_insert_ids: bool = False
+
+
+def _uses_static_pool(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def _enable_sqlite_savepoints(target: AsyncEngine) -> None:
+    # pysqlite defers BEGIN on its own, which breaks SAVEPOINT; let SQLAlchemy emit it.
+    @event.listens_for(target.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(target.sync_engine, "begin")
+    def _emit_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.registry.record_pool_wait(time.perf_counter() - started)
+
+
+def _instrument(target: AsyncEngine) -> None:
+    # Statements are counted and timed against the request that ran them (see metrics).
+    @event.listens_for(target.sync_engine, "before_cursor_execute")
+    def _statement_started(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault(_STATEMENT_STARTS, []).append(time.perf_counter())
+
+    @event.listens_for(target.sync_engine, "after_cursor_execute")
+    def _statement_finished(connection, cursor, statement, parameters, context, executemany):
+        started = connection.info[_STATEMENT_STARTS].pop()
+        metrics.registry.record_statement(statement, time.perf_counter() - started)
+
+    @event.listens_for(target.sync_engine, "handle_error")
+    def _statement_failed(context):
+        starts = context.connection.info.get(_STATEMENT_STARTS) if context.connection is not None else None
+        if starts:
+            metrics.registry.record_statement(context.statement or "", time.perf_counter() - starts.pop())
+
+
+def _track_writes(target: AsyncEngine) -> None:
+    # Tables written in a transaction get a new version (see conditional) once the
+    # connection is back in the pool, i.e. after the commit is visible to readers.
+    @event.listens_for(target.sync_engine, "after_execute")
+    def _statement_written(connection, clauseelement, multiparams, params, execution_options, result):
+        if isinstance(clauseelement, UpdateBase) and hasattr(clauseelement.table, "name"):
+            connection.info.setdefault(_WRITTEN_TABLES, set()).add(clauseelement.table.name)
+
+    @event.listens_for(target.sync_engine, "commit")
+    def _transaction_committed(connection):
+        written = connection.info.pop(_WRITTEN_TABLES, None)
+        if written:
+            connection.info.setdefault(_COMMITTED_TABLES, set()).update(written)
+
+    @event.listens_for(target.sync_engine, "rollback")
+    def _transaction_rolled_back(connection):
+        connection.info.pop(_WRITTEN_TABLES, None)
+
+    @event.listens_for(target.sync_engine, "checkin")
+    def _connection_returned(dbapi_connection, connection_record):
+        committed = connection_record.info.pop(_COMMITTED_TABLES, None)
+        if committed:
+            conditional.tables_changed(committed)
+
+
+def create_engine(url: str, settings: Settings) -> AsyncEngine:
+    options = dict(echo=settings.db_echo, pool_pre_ping=settings.db_pool_pre_ping)
+    if not _uses_static_pool(url):
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_recycle=settings.db_pool_recycle,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    created = create_async_engine(url, **options)
+    if make_url(url).get_backend_name() == "sqlite":
+        _enable_sqlite_savepoints(created)
+    _instrument(created)
+    _track_writes(created)
+    return created
+
+
+async def prewarm(target: AsyncEngine, count: int) -> None:
+    # Connections past pool_size are overflow and would be closed on return.
+    count = min(count, target.pool.size()) if hasattr(target.pool, "size") else count
+    if count <= 0:
+        return
+    connections = await asyncio.gather(*(target.connect() for _ in range(count)))
+    for connection in connections:
+        await connection.close()
+
+
+async def _has_consecutive_insert_ids(target: AsyncEngine) -> bool:
+    # "Interleaved" lock mode (2, the MySQL 8 default) lets concurrent inserts
+    # take ids from the middle of a multi-row INSERT's range.
+    if target.dialect.name != "mysql":
+        return False
+    async with target.connect() as connection:
+        result = await connection.execute(text("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode"))
+        increment, lock_mode = result.one()
+    return int(increment) == 1 and int(lock_mode) in (0, 1)
+
+
+async def init_engine(settings: Settings) -> None:
+    global engine, async_session, replica_engine, replica_session, read_your_writes_seconds, consecutive_insert_ids
+    engine = create_engine(settings.database_url, settings)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    if settings.replica_database_url and settings.replica_database_url != settings.database_url:
+        replica_engine = create_engine(settings.replica_database_url, settings)
+        replica_session = async_sessionmaker(replica_engine, expire_on_commit=False, class_=AsyncSession)
+    else:
+        replica_engine = engine
+        replica_session = async_session
+    read_your_writes_seconds = settings.read_your_writes_seconds
+    cache.set_replica_lag(read_your_writes_seconds if replica_engine is not engine else 0.0)
+
+    await prewarm(engine, settings.db_prewarm)
+    if replica_engine is not engine:
+        await prewarm(replica_engine, settings.db_prewarm)
+    consecutive_insert_ids = await _has_consecutive_insert_ids(engine)
+
+
+def pool_stats() -> Dict[str, int]:
+    pool = engine.pool if engine is not None else None
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {}
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "idle": pool.checkedin()}
+
+
+async def dispose_engine() -> None:
+    global engine, async_session, replica_engine, replica_session, consecutive_insert_ids
+    if replica_engine is not None and replica_engine is not engine:
+        await replica_engine.dispose()
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    async_session = None
+    replica_engine = None
+    replica_session = None
+    consecutive_insert_ids = False
+    cache.set_replica_lag(0.0)
+
+
+def wants_primary(request: Request) -> bool:
+    if request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_session(response: Response) -> AsyncSession:
+    """Session on the primary, for handlers that write.
+
+    Marks the client to read from the primary for ``read_your_writes_seconds``
+    so it sees its own write even while the replica is lagging.
+    """
+    if async_session is None:
+        raise RuntimeError("Database engine is not initialised; start the app through its lifespan")
+    if read_your_writes_seconds > 0 and replica_session is not async_session:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            str(time.time() + read_your_writes_seconds),
+            max_age=max(1, int(read_your_writes_seconds)),
+            httponly=True,
+        )
     async with async_session() as session:
         yield session
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """Session on the read replica, falling back to the primary for read-your-writes."""
+    if async_session is None:
+        raise RuntimeError("Database engine is not initialised; start the app through its lifespan")
+    factory = async_session if wants_primary(request) else replica_session
+    async with factory() as session:
+        yield session
@@ -0,0 +1,89 @@
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import AsyncIterator, Optional, Union
+
+from sqlalchemy import CompoundSelect, Select, select, union_all
+
+import database
+import models
+
+CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    # CSV keeps the column's exact decimal text, e.g. "1500.00".
+    return str(value) if isinstance(value, Decimal) else _plain(value)
+
+
+def _ndjson(rows, columns) -> bytes:
+    return "".join(
+        json.dumps({name: _plain(value) for name, value in zip(columns, row)}, ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _csv(rows, columns=None, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def stream(stmt: Union[Select, CompoundSelect], fmt: str) -> AsyncIterator[bytes]:
+    """Yield ``stmt``'s rows as NDJSON or CSV, ``CHUNK_ROWS`` at a time.
+
+    Runs on its own replica session with a server-side cursor, so memory use
+    does not depend on the number of rows.
+    """
+    columns = [column.name for column in stmt.selected_columns]
+    if fmt == "csv":
+        yield _csv([], columns, header=True)
+    async with database.replica_session() as session:
+        result = await session.stream(stmt.execution_options(yield_per=CHUNK_ROWS))
+        async for rows in result.partitions(CHUNK_ROWS):
+            yield _ndjson(rows, columns) if fmt == "ndjson" else _csv(rows)
+
+
+def _date_range(stmt: Select, column, date_from: Optional[date], date_to: Optional[date]) -> Select:
+    if date_from is not None:
+        stmt = stmt.where(column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        stmt = stmt.where(column < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return stmt
+
+
+def orders(date_from: Optional[date] = None, date_to: Optional[date] = None) -> CompoundSelect:
+    # Archived orders keep their ids and columns, so the export reads both tables as one.
+    names = [column.name for column in models.Order.__table__.columns]
+    branches = []
+    for model in (models.Order, models.ArchivedOrder):
+        table = model.__table__
+        branches.append(_date_range(select(*(table.c[name] for name in names)), table.c.order_date, date_from, date_to))
+    return union_all(*branches).order_by("order_id")
+
+
+def consumable_transactions(date_from: Optional[date] = None, date_to: Optional[date] = None) -> Select:
+    table = models.ConsumableTransaction.__table__
+    stmt = select(*table.c).order_by(table.c.transaction_id)
+    return _date_range(stmt, table.c.transaction_date, date_from, date_to)
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Keys per IN (...) query; larger batches are split.
+MAX_BATCH = 500
+_SESSION_KEY = "loaders"
+
+
+class Loader:
+    """Batches and dedupes primary-key lookups of one model within one session.
+
+    ``load`` calls made in the same event-loop turn (e.g. under
+    ``asyncio.gather``) are answered by a single ``WHERE pk IN (...)`` query,
+    and a key is never fetched twice. Sessions are per request, so the loader
+    is too: get one with ``loader.get(db, Model)``.
+    """
+
+    def __init__(self, db: AsyncSession, model, lock: asyncio.Lock):
+        self.db = db
+        self.model = model
+        self.pk = model.__mapper__.primary_key[0]
+        self.queries = 0
+        self._lock = lock
+        self._rows: Dict[Hashable, Any] = {}
+        self._queued: Dict[Hashable, asyncio.Future] = {}
+        self._dispatch: Optional[asyncio.Task] = None
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        if key in self._rows:
+            row = self._rows[key]
+            # A rollback expires loaded rows; fetch those again rather than lazy-load on access.
+            if row is None or not inspect(row).expired_attributes:
+                return row
+            del self._rows[key]
+        future = self._queued.get(key)
+        if future is None:
+            future = self._queued[key] = asyncio.get_running_loop().create_future()
+            if self._dispatch is None:
+                self._dispatch = asyncio.ensure_future(self._run())
+        return await future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Any]]:
+        """Rows for ``keys`` in the same order, ``None`` where there is no row."""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    async def _run(self) -> None:
+        # Let every coroutine scheduled in this turn queue its keys first.
+        await asyncio.sleep(0)
+        batch, self._queued, self._dispatch = self._queued, {}, None
+        keys = list(batch)
+        try:
+            # One session runs one statement at a time, whichever loader issues it.
+            async with self._lock:
+                for start in range(0, len(keys), MAX_BATCH):
+                    result = await self.db.execute(select(self.model).where(self.pk.in_(keys[start:start + MAX_BATCH])))
+                    self.queries += 1
+                    for row in result.scalars():
+                        self._rows[getattr(row, self.pk.key)] = row
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key, future in batch.items():
+            row = self._rows.setdefault(key, None)
+            if not future.done():
+                future.set_result(row)
+
+
+def get(db: AsyncSession, model) -> Loader:
+    loaders = db.info.setdefault(_SESSION_KEY, {})
+    found = loaders.get(model)
+    if found is None:
+        lock = db.info.setdefault(_SESSION_KEY + "_lock", asyncio.Lock())
+        found = loaders[model] = Loader(db, model, lock)
+    return found
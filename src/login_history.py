@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+import database
+import models
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+
+
+class LoginHistoryWriter:
+    """Buffers login attempts and writes them to ``Login_History`` in batches.
+
+    ``record`` never waits on the database. A background task writes a batch
+    once ``batch_size`` attempts are queued or ``flush_seconds`` after the
+    first one, as one multi-row INSERT. When ``max_queue`` attempts are already
+    waiting, the newest (or, with ``drop_oldest``, the oldest) is dropped and
+    counted, so a brute-force burst cannot exhaust memory.
+    """
+
+    def __init__(self, batch_size: int, flush_seconds: float, max_queue: int, overflow: str = DROP_NEWEST):
+        if overflow not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.overflow = overflow
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        user_login: str,
+        is_successful: bool,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        failure_reason: Optional[str] = None,
+    ) -> None:
+        row = dict(
+            user_login=user_login[:50],
+            attempt_time=datetime.now(),
+            is_successful=is_successful,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            failure_reason=failure_reason,
+        )
+        if self._queue.full():
+            self.dropped += 1
+            if self.overflow == DROP_NEWEST:
+                return
+            self._queue.get_nowait()
+        self._queue.put_nowait(row)
+        self.queued += 1
+        self._pending.set()
+        if self._queue.qsize() >= self.batch_size:
+            self._full.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued, then stop the writer."""
+        self._closing = True
+        self._pending.set()
+        self._full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        while not self._queue.empty():
+            await self._write(self._drain(self.batch_size))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_size": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "queued": self.queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    def _drain(self, limit: int) -> List[dict]:
+        rows = []
+        while len(rows) < limit and not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        return rows
+
+    async def _run(self) -> None:
+        while True:
+            if self._queue.empty():
+                if self._closing:
+                    return
+                self._pending.clear()
+                await self._pending.wait()
+                continue
+            if self._queue.qsize() < self.batch_size and not self._closing:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            await self._write(self._drain(self.batch_size))
+
+    async def _write(self, rows: List[dict]) -> None:
+        if not rows:
+            return
+        try:
+            async with database.async_session() as db:
+                await db.execute(insert(models.LoginHistory), rows)
+                await db.commit()
+        except Exception:
+            # Audit rows are not retried: a database outage must not grow the queue without bound.
+            self.failed += len(rows)
+            logger.exception("Failed to write %d login history rows", len(rows))
+            return
+        self.written += len(rows)
+        self.batches += 1
+
+
+_settings = get_settings()
+writer = LoginHistoryWriter(
+    _settings.login_history_batch_size,
+    _settings.login_history_flush_seconds,
+    _settings.login_history_max_queue,
+    _settings.login_history_overflow,
+)
@@ -1,14 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import List, Literal, Optional, Set
 
+import archive
+import availability
+import cache
+import coalesce
+import conditional
 import models
 import schemas
 import crud
-from database import get_session
+import database
+import export
+import login_history
+import metrics
+import pagination
+import passwords
+import reports
+import serialization
+import sessions
+from config import get_settings
+from database import get_read_session, get_session
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    await database.init_engine(settings)
+    sessions.store.start(settings.session_flush_seconds)
+    login_history.writer.start()
+    archive.archiver.start(settings.archive_interval_seconds)
+    try:
+        yield
+    finally:
+        await archive.archiver.stop()
+        await login_history.writer.stop()
+        await sessions.store.stop()
+        passwords.hasher.shutdown()
+        await database.dispose_engine()
+
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(sessions.authenticate)])
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,13 +52,167 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.registry.add_collector("db_pool", database.pool_stats)
+metrics.registry.add_collector("password_hasher", passwords.hasher.stats)
+metrics.registry.add_collector("login_history", login_history.writer.stats)
+metrics.registry.add_collector("sessions", sessions.store.stats)
+metrics.registry.add_collector("archive", archive.archiver.stats)
+metrics.registry.add_family(
+    "igora_coalesced_runs_total", "counter", "Handler runs on coalesced routes.",
+    lambda: [({"route": route}, counts["runs"]) for route, counts in sorted(coalesce.stats().items())],
 )
+metrics.registry.add_family(
+    "igora_coalesced_saved_total", "counter", "Requests answered by another request's run instead of their own query.",
+    lambda: [({"route": route}, counts["saved"]) for route, counts in sorted(coalesce.stats().items())],
+)
+metrics.registry.add_collector(
+    "cache", lambda: {f"{namespace}_{key}": value for namespace, stats in cache.stats().items() for key, value in stats.items()}
+)
+
+
+@app.exception_handler(pagination.InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: pagination.InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(crud.BulkInsertError)
+async def bulk_insert_error_handler(request: Request, exc: crud.BulkInsertError):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": exc.detail, "failed_range": [exc.start, exc.end]},
+    )
+
+
+@app.exception_handler(crud.OrderValidationError)
+async def order_validation_error_handler(request: Request, exc: crud.OrderValidationError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(crud.EquipmentUnavailable)
+async def equipment_unavailable_handler(request: Request, exc: crud.EquipmentUnavailable):
+    return JSONResponse(status_code=409, content={"detail": str(exc), "equipment_ids": exc.equipment_ids})
+
+
+@app.exception_handler(passwords.PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: passwords.PasswordHasherBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(reports.UnknownReportsUser)
+async def unknown_reports_user_handler(request: Request, exc: reports.UnknownReportsUser):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+@app.exception_handler(crud.StockValidationError)
+async def stock_validation_error_handler(request: Request, exc: crud.StockValidationError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(crud.InsufficientStock)
+async def insufficient_stock_handler(request: Request, exc: crud.InsufficientStock):
+    return JSONResponse(status_code=409, content={"detail": str(exc), "consumable_ids": exc.consumable_ids})
+
+
+def check_bulk_size(items: list):
+    if len(items) > get_settings().bulk_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {get_settings().bulk_max_items} items per request")
+
+
+def bulk_result(ids, errors) -> schemas.BulkCreateResult:
+    return schemas.BulkCreateResult(
+        ids=ids,
+        errors=[schemas.BulkItemError(index=index, detail=detail) for index, detail in errors],
+    )
+
+
+IDS_DESCRIPTION = "Comma-separated ids: return these rows, in this order, instead of a page"
+MAX_MULTI_GET_IDS = 1000
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    if ids is None:
+        return None
+    try:
+        wanted = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(wanted) > MAX_MULTI_GET_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MULTI_GET_IDS} ids per request")
+    return wanted
+
+def set_next_cursor(response: Response, rows, limit: int, pk: str, sort: Optional[str] = None):
+    cursor = pagination.next_cursor(rows, limit, pk, sort)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = cursor
+    return rows
+
+
+def page(model: type, response: Response, rows, limit: int, pk: str, sort: Optional[str] = None):
+    return serialization.render(model, set_next_cursor(response, rows, limit, pk, sort), response, many=True)
 
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to Igora Rental API"}
 
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# Auth endpoints
+@app.post("/auth/login", response_model=schemas.SessionInfo)
+async def login(
+    credentials: schemas.LoginRequest, request: Request, response: Response, db: AsyncSession = Depends(get_session)
+):
+    client_host = request.client.host if request.client else None
+    user_agent = request.headers.get("User-Agent")
+    try:
+        db_user = await crud.authenticate_user(db, credentials.login, credentials.password)
+    except passwords.PasswordHasherBusy:
+        # A brute-force burst is what saturates the hasher; its rejected attempts are logged too.
+        login_history.writer.record(credentials.login, False, client_host, user_agent, "rejected: hasher busy")
+        raise
+    login_history.writer.record(
+        credentials.login,
+        db_user is not None,
+        client_host,
+        user_agent,
+        None if db_user is not None else "Incorrect login or password",
+    )
+    if db_user is None:
+        raise HTTPException(status_code=401, detail="Incorrect login or password")
+    session = await sessions.store.create(db, db_user.user_id)
+    response.set_cookie(
+        sessions.SESSION_COOKIE,
+        session.session_id,
+        max_age=int(session.duration.total_seconds()),
+        httponly=True,
+    )
+    return schemas.SessionInfo(session_id=session.session_id, user_id=session.user_id, expires_at=session.expires_at)
+
+@app.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    response: Response,
+    session: sessions.ActiveSession = Depends(sessions.current_session),
+    db: AsyncSession = Depends(get_session),
+):
+    await sessions.store.revoke(db, session.session_id)
+    response.delete_cookie(sessions.SESSION_COOKIE)
+
+@app.get("/auth/me", response_model=schemas.User)
+async def read_current_user(
+    session: sessions.ActiveSession = Depends(sessions.current_session),
+    db: AsyncSession = Depends(get_read_session),
+):
+    db_user = await crud.get_user(db, session.user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
+
 # Roles endpoints
 @app.post("/roles/", response_model=schemas.Role)
 async def create_role(role: schemas.RoleCreate, db: AsyncSession = Depends(get_session)):
@@ -30,16 +220,23 @@ async def create_role(role: schemas.RoleCreate, db: AsyncSession = Depends(get_s
     return db_role
 
 @app.get("/roles/", response_model=List[schemas.Role])
-async def read_roles(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
-    roles = await crud.get_roles(db, skip=skip, limit=limit)
-    return roles
+@coalesce.coalesced
+async def read_roles(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ids: Optional[str] = Query(None, description=IDS_DESCRIPTION), db: AsyncSession = Depends(get_read_session)):
+    unchanged = conditional.not_modified(request, response, conditional.collection_etag(request, "Roles"))
+    if unchanged is not None:
+        return unchanged
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.Role, await crud.get_by_ids(db, models.Role, wanted), response, many=True)
+    roles = await crud.get_roles(db, skip=skip, limit=limit, cursor=cursor)
+    return page(schemas.Role, response, roles, limit, "role_id")
 
 @app.get("/roles/{role_id}", response_model=schemas.Role)
-async def read_role(role_id: int, db: AsyncSession = Depends(get_session)):
+async def read_role(role_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_session)):
     db_role = await crud.get_role(db, role_id)
     if db_role is None:
         raise HTTPException(status_code=404, detail="Role not found")
-    return db_role
+    return conditional.not_modified(request, response, conditional.row_etag(db_role)) or db_role
 
 # Users endpoints
 @app.post("/users/", response_model=schemas.User)
@@ -51,12 +248,15 @@ async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_s
     return created_user
 
 @app.get("/users/", response_model=List[schemas.User])
-async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
-    users = await crud.get_users(db, skip=skip, limit=limit)
-    return users
+async def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ids: Optional[str] = Query(None, description=IDS_DESCRIPTION), db: AsyncSession = Depends(get_read_session)):
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.User, await crud.get_by_ids(db, models.User, wanted), response, many=True)
+    users = await crud.get_users(db, skip=skip, limit=limit, cursor=cursor)
+    return page(schemas.User, response, users, limit, "user_id")
 
 @app.get("/users/{user_id}", response_model=schemas.User)
-async def read_user(user_id: int, db: AsyncSession = Depends(get_session)):
+async def read_user(user_id: int, db: AsyncSession = Depends(get_read_session)):
     db_user = await crud.get_user(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -68,13 +268,51 @@ async def create_client(client: schemas.ClientCreate, db: AsyncSession = Depends
     created_client = await crud.create_client(db, client)
     return created_client
 
+@app.post("/clients/bulk", response_model=schemas.BulkCreateResult)
+async def create_clients_bulk(
+    clients: List[schemas.ClientCreate], continue_on_error: bool = False, db: AsyncSession = Depends(get_session)
+):
+    check_bulk_size(clients)
+    ids, errors = await crud.create_clients_bulk(db, clients, get_settings().bulk_chunk_size, continue_on_error)
+    return bulk_result(ids, errors)
+
 @app.get("/clients/", response_model=List[schemas.Client])
-async def read_clients(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
-    clients = await crud.get_clients(db, skip=skip, limit=limit)
-    return clients
+@coalesce.coalesced
+async def read_clients(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    sort: Literal["client_id", "last_name", "client_code"] = "client_id",
+    last_name: Optional[str] = None,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.Client, await crud.get_by_ids(db, models.Client, wanted), response, many=True)
+    clients = await crud.get_clients(
+        db, skip=skip, limit=limit, cursor=cursor, sort=sort, last_name=last_name, phone=phone, email=email
+    )
+    return page(schemas.Client, response, clients, limit, "client_id", sort)
+
+@app.get("/clients/search", response_model=List[schemas.Client])
+async def search_clients(
+    q: str = Query(min_length=2, description="Surname, \"Surname First\", phone digits, email or client code prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    fuzzy: bool = True,
+    db: AsyncSession = Depends(get_read_session),
+):
+    # min_length counts surrounding spaces; a blank q would match every client.
+    if len(q.strip()) < 2:
+        raise HTTPException(status_code=400, detail="q must have at least 2 characters besides spaces")
+    return await crud.search_clients(db, q, limit, fuzzy)
 
 @app.get("/clients/{client_id}", response_model=schemas.Client)
-async def read_client(client_id: int, db: AsyncSession = Depends(get_session)):
+@coalesce.coalesced
+async def read_client(client_id: int, db: AsyncSession = Depends(get_read_session)):
     db_client = await crud.get_client(db, client_id)
     if db_client is None:
         raise HTTPException(status_code=404, detail="Client not found")
@@ -88,18 +326,25 @@ async def create_equipment_category(category: schemas.EquipmentCategoryCreate, d
     return created_category
 
 @app.get("/equipment-categories/", response_model=List[schemas.EquipmentCategory])
-async def read_equipment_categories(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
+@coalesce.coalesced
+async def read_equipment_categories(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ids: Optional[str] = Query(None, description=IDS_DESCRIPTION), db: AsyncSession = Depends(get_read_session)):
+    unchanged = conditional.not_modified(request, response, conditional.collection_etag(request, "Equipment_Categories"))
+    if unchanged is not None:
+        return unchanged
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.EquipmentCategory, await crud.get_by_ids(db, models.EquipmentCategory, wanted), response, many=True)
     from crud import get_equipment_categories
-    categories = await get_equipment_categories(db, skip=skip, limit=limit)
-    return categories
+    categories = await get_equipment_categories(db, skip=skip, limit=limit, cursor=cursor)
+    return page(schemas.EquipmentCategory, response, categories, limit, "category_id")
 
 @app.get("/equipment-categories/{category_id}", response_model=schemas.EquipmentCategory)
-async def read_equipment_category(category_id: int, db: AsyncSession = Depends(get_session)):
+async def read_equipment_category(category_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_session)):
     from crud import get_equipment_category
     db_category = await get_equipment_category(db, category_id)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Equipment category not found")
-    return db_category
+    return conditional.not_modified(request, response, conditional.row_etag(db_category)) or db_category
 
 # Equipment endpoints
 @app.post("/equipment/", response_model=schemas.Equipment)
@@ -108,19 +353,66 @@ async def create_equipment(equipment: schemas.EquipmentCreate, db: AsyncSession
     created_equipment = await create_equipment(db, equipment)
     return created_equipment
 
+@app.post("/equipment/bulk", response_model=schemas.BulkCreateResult)
+async def create_equipment_bulk(
+    equipment: List[schemas.EquipmentCreate], continue_on_error: bool = False, db: AsyncSession = Depends(get_session)
+):
+    check_bulk_size(equipment)
+    ids, errors = await crud.create_equipment_bulk(db, equipment, get_settings().bulk_chunk_size, continue_on_error)
+    return bulk_result(ids, errors)
+
 @app.get("/equipment/", response_model=List[schemas.Equipment])
-async def read_equipment(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
+@coalesce.coalesced
+async def read_equipment(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    sort: Literal["equipment_id", "category_id"] = "equipment_id",
+    category_id: Optional[int] = None,
+    is_available: Optional[bool] = None,
+    condition_status: Optional[schemas.EquipmentConditionStatus] = None,
+    size: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    unchanged = conditional.not_modified(request, response, conditional.collection_etag(request, "Equipment"))
+    if unchanged is not None:
+        return unchanged
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.Equipment, await crud.get_by_ids(db, models.Equipment, wanted), response, many=True)
     from crud import get_equipment
-    equipment_list = await get_equipment(db, skip=skip, limit=limit)
-    return equipment_list
+    equipment_list = await get_equipment(
+        db, skip=skip, limit=limit, cursor=cursor, sort=sort,
+        category_id=category_id, is_available=is_available, condition_status=condition_status, size=size,
+    )
+    return page(schemas.Equipment, response, equipment_list, limit, "equipment_id", sort)
+
+@app.get("/equipment/availability", response_model=List[schemas.Equipment])
+async def read_equipment_availability(
+    category_id: int,
+    start: datetime = Query(alias="from"),
+    end: datetime = Query(alias="to"),
+    size: Optional[str] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_read_session),
+):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be later than 'from'")
+    await availability.index.ensure_fresh(lambda: crud.load_availability(db))
+    free_ids = availability.index.free(category_id, start, end, size)[:limit]
+    return await crud.get_equipment_by_ids(db, free_ids)
 
 @app.get("/equipment/{equipment_id}", response_model=schemas.Equipment)
-async def read_equipment_item(equipment_id: int, db: AsyncSession = Depends(get_session)):
+@coalesce.coalesced
+async def read_equipment_item(equipment_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_session)):
     from crud import get_equipment_item
     db_equipment = await get_equipment_item(db, equipment_id)
     if db_equipment is None:
         raise HTTPException(status_code=404, detail="Equipment not found")
-    return db_equipment
+    return conditional.not_modified(request, response, conditional.row_etag(db_equipment)) or db_equipment
 
 # Services endpoints
 @app.post("/services/", response_model=schemas.Service)
@@ -130,18 +422,26 @@ async def create_service(service: schemas.ServiceCreate, db: AsyncSession = Depe
     return created_service
 
 @app.get("/services/", response_model=List[schemas.Service])
-async def read_services(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
+@coalesce.coalesced
+async def read_services(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ids: Optional[str] = Query(None, description=IDS_DESCRIPTION), db: AsyncSession = Depends(get_read_session)):
+    unchanged = conditional.not_modified(request, response, conditional.collection_etag(request, "Services"))
+    if unchanged is not None:
+        return unchanged
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.Service, await crud.get_by_ids(db, models.Service, wanted), response, many=True)
     from crud import get_services
-    services = await get_services(db, skip=skip, limit=limit)
-    return services
+    services = await get_services(db, skip=skip, limit=limit, cursor=cursor)
+    return page(schemas.Service, response, services, limit, "service_id")
 
 @app.get("/services/{service_id}", response_model=schemas.Service)
-async def read_service(service_id: int, db: AsyncSession = Depends(get_session)):
+@coalesce.coalesced
+async def read_service(service_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_session)):
     from crud import get_service
     db_service = await get_service(db, service_id)
     if db_service is None:
         raise HTTPException(status_code=404, detail="Service not found")
-    return db_service
+    return conditional.not_modified(request, response, conditional.row_etag(db_service)) or db_service
 
 # Orders endpoints
 @app.post("/orders/", response_model=schemas.Order)
@@ -150,17 +450,216 @@ async def create_order(order: schemas.OrderCreate, db: AsyncSession = Depends(ge
     created_order = await create_order(db, order)
     return created_order
 
-@app.get("/orders/", response_model=List[schemas.Order])
-async def read_orders(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_session)):
+@app.post("/orders/full", response_model=schemas.OrderFull)
+async def create_order_full(order: schemas.OrderFullCreate, db: AsyncSession = Depends(get_session)):
+    db_order, lines = await crud.create_order_full(db, order)
+    return schemas.OrderFull(
+        **schemas.Order.model_validate(db_order).model_dump(),
+        lines=[schemas.OrderService(**line) for line in lines],
+    )
+
+def order_detail(order: models.Order, expand: Set[str]) -> schemas.OrderDetail:
+    # Read only the relations that were eager-loaded; touching any other would lazy-load.
+    data = {name: getattr(order, name) for name in schemas.Order.model_fields}
+    for relation in ("client", "user"):
+        if relation in expand:
+            data[relation] = getattr(order, relation)
+    if "lines" in expand:
+        data["lines"] = [
+            {
+                **{name: getattr(line, name) for name in schemas.OrderService.model_fields},
+                **{relation: getattr(line, relation) for relation in ("service", "equipment") if "lines." + relation in expand},
+            }
+            for line in order.lines
+        ]
+    return schemas.OrderDetail.model_validate(data, from_attributes=True)
+
+def parse_order_expand(expand: Optional[str]) -> Set[str]:
+    try:
+        return crud.parse_order_expand(expand)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@app.get("/orders/", response_model=List[schemas.OrderDetail], response_model_exclude_unset=True)
+@coalesce.coalesced
+async def read_orders(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION),
+    sort: Literal["order_id", "order_date"] = "order_id",
+    expand: Optional[str] = Query(None, description="Comma-separated: " + ",".join(crud.ORDER_EXPANSIONS)),
+    status: Optional[schemas.OrderStatus] = None,
+    client_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    date_from: Optional[datetime] = Query(None, description="order_date from, inclusive"),
+    date_to: Optional[datetime] = Query(None, description="order_date to, exclusive"),
+    db: AsyncSession = Depends(get_read_session),
+):
     from crud import get_orders
-    orders = await get_orders(db, skip=skip, limit=limit)
-    return orders
+    if date_from is not None and date_to is not None and date_to <= date_from:
+        raise HTTPException(status_code=400, detail="date_to must be later than date_from")
+    expansions = parse_order_expand(expand)
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        orders = await crud.get_orders_by_ids(db, wanted, expand=expansions)
+    else:
+        orders = await get_orders(
+            db, skip=skip, limit=limit, cursor=cursor, sort=sort, expand=expansions,
+            status=status, client_id=client_id, user_id=user_id, date_from=date_from, date_to=date_to,
+        )
+        set_next_cursor(response, orders, limit, "order_id", sort)
+    details = [order_detail(order, expansions) for order in orders]
+    return serialization.render(schemas.OrderDetail, details, response, many=True, exclude_unset=True)
+
+@app.get("/orders/{order_id}", response_model=schemas.OrderDetail, response_model_exclude_unset=True)
+@coalesce.coalesced
+async def read_order(
+    order_id: int,
+    expand: Optional[str] = Query(None, description="Comma-separated: " + ",".join(crud.ORDER_EXPANSIONS)),
+    db: AsyncSession = Depends(get_read_session),
+):
+    expansions = parse_order_expand(expand)
+    db_order = await crud.get_order_or_archived(db, order_id, expand=expansions)
+    if db_order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return serialization.render(schemas.OrderDetail, order_detail(db_order, expansions), exclude_unset=True)
 
-@app.get("/orders/{order_id}", response_model=schemas.Order)
-async def read_order(order_id: int, db: AsyncSession = Depends(get_session)):
-    from crud import get_order
-    db_order = await get_order(db, order_id)
+@app.patch("/orders/{order_id}/status", response_model=schemas.Order)
+async def update_order_status(order_id: int, update: schemas.OrderStatusUpdate, db: AsyncSession = Depends(get_session)):
+    db_order = await crud.update_order_status(db, order_id, update.status)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     return db_order
 
+# Order Services endpoints
+@app.post("/order-services/bulk", response_model=schemas.BulkCreateResult)
+async def create_order_services_bulk(
+    lines: List[schemas.OrderServiceCreate], continue_on_error: bool = False, db: AsyncSession = Depends(get_session)
+):
+    check_bulk_size(lines)
+    ids, errors = await crud.create_order_services_bulk(db, lines, get_settings().bulk_chunk_size, continue_on_error)
+    return bulk_result(ids, errors)
+
+# Equipment Returns endpoints
+@app.post("/equipment-returns/", response_model=schemas.EquipmentReturn)
+async def create_equipment_return(equipment_return: schemas.EquipmentReturnCreate, db: AsyncSession = Depends(get_session)):
+    created_return = await crud.create_equipment_return(db, equipment_return)
+    return created_return
+
+# Scan endpoints
+@app.get("/scan/{barcode}", response_model=schemas.ScanResult, response_model_exclude_unset=True)
+async def scan_barcode(barcode: str, db: AsyncSession = Depends(get_read_session)):
+    resolved = await crud.resolve_barcode(db, barcode)
+    if resolved is not None:
+        kind, found_id = resolved
+        if kind == crud.SCAN_ORDER:
+            db_order = await crud.get_order_or_archived(db, found_id, expand={"lines"})
+            if db_order is not None:
+                return schemas.ScanResult(kind=kind, order=order_detail(db_order, {"lines"}))
+        else:
+            db_equipment = await crud.get_equipment_item(db, found_id)
+            if db_equipment is not None:
+                active_order = await crud.get_active_order_for_equipment(db, found_id)
+                return schemas.ScanResult(
+                    kind=kind,
+                    equipment=schemas.Equipment.model_validate(db_equipment),
+                    active_order=schemas.Order.model_validate(active_order) if active_order is not None else None,
+                )
+    raise HTTPException(status_code=404, detail="Barcode not found")
+
+# Consumables endpoints
+@app.post("/consumables/", response_model=schemas.Consumable)
+async def create_consumable(consumable: schemas.ConsumableCreate, db: AsyncSession = Depends(get_session)):
+    created_consumable = await crud.create_consumable(db, consumable)
+    return created_consumable
+
+@app.get("/consumables/", response_model=List[schemas.Consumable])
+async def read_consumables(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ids: Optional[str] = Query(None, description=IDS_DESCRIPTION), db: AsyncSession = Depends(get_read_session)):
+    wanted = parse_ids(ids)
+    if wanted is not None:
+        return serialization.render(schemas.Consumable, await crud.get_by_ids(db, models.Consumable, wanted), response, many=True)
+    consumables = await crud.get_consumables(db, skip=skip, limit=limit, cursor=cursor)
+    return page(schemas.Consumable, response, consumables, limit, "consumable_id")
+
+@app.get("/consumables/low-stock", response_model=List[schemas.Consumable])
+async def read_low_stock_consumables(db: AsyncSession = Depends(get_read_session)):
+    return await crud.get_low_stock_consumables(db)
+
+@app.get("/consumables/{consumable_id}", response_model=schemas.Consumable)
+async def read_consumable(consumable_id: int, db: AsyncSession = Depends(get_read_session)):
+    db_consumable = await crud.get_consumable(db, consumable_id)
+    if db_consumable is None:
+        raise HTTPException(status_code=404, detail="Consumable not found")
+    return db_consumable
+
+# Consumable Transactions endpoints
+@app.post("/consumable-transactions/", response_model=schemas.ConsumableTransaction)
+async def create_consumable_transaction(transaction: schemas.ConsumableTransactionCreate, db: AsyncSession = Depends(get_session)):
+    created = await crud.create_consumable_transactions(db, [transaction])
+    return created[0]
+
+@app.post("/consumable-transactions/batch", response_model=List[schemas.ConsumableTransaction])
+async def create_consumable_transactions(transactions: List[schemas.ConsumableTransactionCreate], db: AsyncSession = Depends(get_session)):
+    check_bulk_size(transactions)
+    if not transactions:
+        return []
+    return await crud.create_consumable_transactions(db, transactions)
+
+@app.get("/consumable-transactions/", response_model=List[schemas.ConsumableTransaction])
+async def read_consumable_transactions(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Literal["transaction_id", "transaction_date"] = "transaction_id",
+    consumable_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_session),
+):
+    transactions = await crud.get_consumable_transactions(
+        db, skip=skip, limit=limit, cursor=cursor, sort=sort, consumable_id=consumable_id
+    )
+    return page(schemas.ConsumableTransaction, response, transactions, limit, "transaction_id", sort)
+
+# Reports endpoints
+def check_report_range(date_from: date, date_to: date):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be earlier than date_from")
+
+def session_user_id(session: Optional[sessions.ActiveSession]) -> Optional[int]:
+    return session.user_id if session is not None else None
+
+@app.get("/reports/daily-statistics", response_model=List[schemas.DailyStatistics])
+async def read_daily_statistics(
+    date_from: date, date_to: date, session: Optional[sessions.ActiveSession] = Depends(sessions.authenticate)
+):
+    check_report_range(date_from, date_to)
+    return await reports.get_report(reports.DAILY_STATISTICS, date_from, date_to, session_user_id(session))
+
+@app.get("/reports/popular-services", response_model=List[schemas.PopularService])
+async def read_popular_services(
+    date_from: date, date_to: date, session: Optional[sessions.ActiveSession] = Depends(sessions.authenticate)
+):
+    check_report_range(date_from, date_to)
+    return await reports.get_report(reports.POPULAR_SERVICES, date_from, date_to, session_user_id(session))
+
+# Export endpoints
+def export_response(stmt, fmt: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        export.stream(stmt, fmt),
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+@app.get("/export/orders")
+async def export_orders(
+    format: Literal["ndjson", "csv"] = "ndjson", date_from: Optional[date] = None, date_to: Optional[date] = None
+):
+    return export_response(export.orders(date_from, date_to), format, "orders")
+
+@app.get("/export/consumable-transactions")
+async def export_consumable_transactions(
+    format: Literal["ndjson", "csv"] = "ndjson", date_from: Optional[date] = None, date_to: Optional[date] = None
+):
+    return export_response(export.consumable_transactions(date_from, date_to), format, "consumable-transactions")
@@ -0,0 +1,251 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+# Statements kept per request for the slow-request log.
+MAX_LOGGED_STATEMENTS = 50
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Cumulative Prometheus histogram; ``counts[i]`` is observations ``<= buckets[i]``."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # Stored per bucket, made cumulative when rendered.
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        running, result = 0, []
+        for count in self.counts:
+            running += count
+            result.append(running)
+        return result
+
+
+@dataclass
+class RequestMetrics:
+    """What one request did on the database; filled by the engine hooks in ``database``."""
+
+    statements: int = 0
+    db_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    log: Optional[List[Tuple[str, float]]] = None
+
+
+@dataclass
+class RouteMetrics:
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    statements: Histogram = field(default_factory=lambda: Histogram(STATEMENT_BUCKETS))
+    db_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self.slow_requests = 0
+        # Named callables returning ``{name: number}``, rendered as gauges.
+        self.collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        # Metric name -> (type, help, callable returning ``[(labels, value)]``).
+        self.families: Dict[str, Tuple[str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = {}
+
+    def record_statement(self, statement: str, seconds: float) -> None:
+        self.statements += 1
+        self.db_seconds += seconds
+        current = _current.get()
+        if current is not None:
+            current.statements += 1
+            current.db_seconds += seconds
+            if current.log is not None and len(current.log) < MAX_LOGGED_STATEMENTS:
+                current.log.append((statement, seconds))
+
+    def record_pool_wait(self, seconds: float) -> None:
+        self.pool_wait.observe(seconds)
+        current = _current.get()
+        if current is not None:
+            current.pool_wait_seconds += seconds
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, request: RequestMetrics) -> None:
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = RouteMetrics()
+        stats.latency.observe(seconds)
+        stats.statements.observe(request.statements)
+        stats.db_seconds += request.db_seconds
+        stats.pool_wait_seconds += request.pool_wait_seconds
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, float]]) -> None:
+        self.collectors[name] = collect
+
+    def add_family(self, name: str, kind: str, text: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+        self.families[name] = (kind, text, collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        routes = sorted(self.routes.items())
+
+        def header(name: str, kind: str, text: str) -> None:
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, text: str, items: Iterable[Tuple[Dict[str, str], Histogram]]) -> None:
+            header(name, "histogram", text)
+            for labels, values in items:
+                for bound, count in zip(values.buckets, values.cumulative()):
+                    lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {values.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(values.total)}")
+                lines.append(f"{name}_count{_labels(labels)} {values.count}")
+
+        def route_labels(key: Tuple[str, str]) -> Dict[str, str]:
+            return {"method": key[0], "route": key[1]}
+
+        histogram(
+            "igora_request_duration_seconds", "Request latency by route template.",
+            ((route_labels(key), stats.latency) for key, stats in routes),
+        )
+        histogram(
+            "igora_request_sql_statements", "SQL statements executed per request.",
+            ((route_labels(key), stats.statements) for key, stats in routes),
+        )
+        header("igora_requests_total", "counter", "Requests by route template and status.")
+        for key, stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f"igora_requests_total{_labels(route_labels(key), status=str(status))} {count}")
+        header("igora_request_db_seconds_total", "counter", "Time spent executing SQL, by route template.")
+        for key, stats in routes:
+            lines.append(f"igora_request_db_seconds_total{_labels(route_labels(key))} {_number(stats.db_seconds)}")
+        header("igora_request_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection, by route template.")
+        for key, stats in routes:
+            lines.append(f"igora_request_pool_wait_seconds_total{_labels(route_labels(key))} {_number(stats.pool_wait_seconds)}")
+
+        header("igora_sql_statements_total", "counter", "SQL statements executed, including background work.")
+        lines.append(f"igora_sql_statements_total {self.statements}")
+        header("igora_sql_seconds_total", "counter", "Time spent executing SQL, including background work.")
+        lines.append(f"igora_sql_seconds_total {_number(self.db_seconds)}")
+        histogram("igora_db_pool_wait_seconds", "Time to check a connection out of the pool.", [({}, self.pool_wait)])
+        header("igora_slow_requests_total", "counter", "Requests slower than IGORA_SLOW_REQUEST_SECONDS.")
+        lines.append(f"igora_slow_requests_total {self.slow_requests}")
+
+        for name, (kind, text, collect) in sorted(self.families.items()):
+            try:
+                samples = list(collect())
+            except Exception:
+                logger.exception("Metrics family %s failed", name)
+                continue
+            header(name, kind, text)
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        for name, collect in sorted(self.collectors.items()):
+            try:
+                values = collect()
+            except Exception:
+                logger.exception("Metrics collector %s failed", name)
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)):
+                    metric = f"igora_{name}_{key}"
+                    header(metric, "gauge", f"{name} {key.replace('_', ' ')}.")
+                    lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    pairs = {**labels, **extra}
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request against its route template.
+
+    The route (``/orders/{order_id}``, not the concrete path) is read from the
+    scope after routing, so one label set covers every id. Requests slower than
+    ``IGORA_SLOW_REQUEST_SECONDS`` are logged with the statements they ran.
+    """
+
+    def __init__(self, app, slow_request_seconds: Optional[float] = None):
+        self.app = app
+        if slow_request_seconds is None:
+            slow_request_seconds = get_settings().slow_request_seconds
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = RequestMetrics(log=[] if self.slow_request_seconds > 0 else None)
+        token = _current.set(request)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or UNMATCHED_ROUTE
+            registry.record_request(scope["method"], template, status, elapsed, request)
+            if request.log is not None and elapsed >= self.slow_request_seconds:
+                registry.slow_requests += 1
+                self._log_slow(scope, status, elapsed, request)
+
+    def _log_slow(self, scope, status: int, elapsed: float, request: RequestMetrics) -> None:
+        lines = [
+            f"{seconds * 1000:8.1f} ms  {' '.join(statement.split())}" for statement, seconds in request.log
+        ]
+        if request.statements > len(request.log):
+            lines.append(f"... {request.statements - len(request.log)} more")
+        logger.warning(
+            "Slow request %s %s -> %s in %.0f ms: %d statements, %.0f ms in SQL, %.0f ms waiting for a connection%s",
+            scope["method"], scope["path"], status, elapsed * 1000, request.statements,
+            request.db_seconds * 1000, request.pool_wait_seconds * 1000, "".join("\n" + line for line in lines),
+        )
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, Boolean, Date, DateTime, Enum, ForeignKey, DECIMAL, JSON
+    Column, BigInteger, Integer, String, Text, Boolean, Date, DateTime, Enum, ForeignKey, Index, DECIMAL, JSON
 )
 from sqlalchemy.orm import relationship, declarative_base
 import enum
@@ -47,6 +47,12 @@ class Client(Base):
     created_at = Column(DateTime)
     updated_at = Column(DateTime)
 
+    # idx_clients_email and idx_clients_code duplicate the unique constraints' indexes.
+    __table_args__ = (
+        Index("idx_clients_phone", "phone"),
+        Index("idx_clients_name", "last_name", "first_name"),
+    )
+
 class EquipmentCategory(Base):
     __tablename__ = "Equipment_Categories"
     category_id = Column(Integer, primary_key=True, index=True)
@@ -79,6 +85,13 @@ class Equipment(Base):
 
     category = relationship("EquipmentCategory", back_populates="equipment")
 
+    __table_args__ = (
+        Index("idx_equipment_available", "is_available"),
+        Index("idx_equipment_category", "category_id"),
+        Index("idx_equipment_condition", "condition_status"),
+        Index("idx_equipment_size", "size"),
+    )
+
 class Service(Base):
     __tablename__ = "Services"
     service_id = Column(Integer, primary_key=True, index=True)
@@ -118,6 +131,14 @@ class Order(Base):
 
     client = relationship("Client")
     user = relationship("User")
+    lines = relationship("OrderService", back_populates="order")
+
+    __table_args__ = (
+        Index("idx_orders_date", "order_date"),
+        Index("idx_orders_status", "status"),
+        Index("idx_orders_client", "client_id", "order_date"),
+        Index("idx_orders_user", "user_id", "order_date"),
+    )
 
 class OrderService(Base):
     __tablename__ = "Order_Services"
@@ -131,10 +152,15 @@ class OrderService(Base):
     rental_hours = Column(Integer)
     notes = Column(Text)
 
-    order = relationship("Order")
+    order = relationship("Order", back_populates="lines")
     service = relationship("Service")
     equipment = relationship("Equipment")
 
+    __table_args__ = (
+        Index("idx_order_services_order", "order_id"),
+        Index("idx_order_services_service", "service_id"),
+    )
+
 class EquipmentReturnCondition(enum.Enum):
     excellent = "excellent"
     good = "good"
@@ -157,11 +183,113 @@ class EquipmentReturn(Base):
     equipment = relationship("Equipment")
     returned_by_user = relationship("User")
 
+    __table_args__ = (
+        Index("idx_returns_date", "return_date"),
+        Index("idx_returns_order", "order_id"),
+    )
+
+# Closed orders moved out of the hot tables by archive.py, with their lines and
+# returns. Same columns and ids as the originals plus archived_at; read-only.
+class ArchivedOrder(Base):
+    __tablename__ = "Orders_Archive"
+    order_id = Column(Integer, primary_key=True, autoincrement=False)
+    order_number = Column(String(50), unique=True, nullable=False)
+    client_id = Column(Integer, ForeignKey("Clients.client_id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("Users.user_id"), nullable=False)
+    order_date = Column(DateTime)
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=False)
+    total_amount = Column(DECIMAL(12, 2), default=0)
+    deposit_amount = Column(DECIMAL(10, 2))
+    status = Column(Enum(OrderStatus))
+    barcode = Column(String(255), unique=True)
+    notes = Column(Text)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime)
+
+    client = relationship("Client")
+    user = relationship("User")
+    lines = relationship("ArchivedOrderService", back_populates="order")
+
+    __table_args__ = (
+        Index("idx_orders_archive_date", "order_date"),
+        Index("idx_orders_archive_client", "client_id", "order_date"),
+    )
+
+class ArchivedOrderService(Base):
+    __tablename__ = "Order_Services_Archive"
+    order_service_id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, ForeignKey("Orders_Archive.order_id"), nullable=False)
+    service_id = Column(Integer, ForeignKey("Services.service_id"), nullable=False)
+    equipment_id = Column(Integer, ForeignKey("Equipment.equipment_id"))
+    quantity = Column(Integer, default=1)
+    unit_price = Column(DECIMAL(10, 2), nullable=False)
+    total_price = Column(DECIMAL(10, 2), nullable=False)
+    rental_hours = Column(Integer)
+    notes = Column(Text)
+
+    order = relationship("ArchivedOrder", back_populates="lines")
+    service = relationship("Service")
+    equipment = relationship("Equipment")
+
+    __table_args__ = (
+        Index("idx_order_services_archive_order", "order_id"),
+    )
+
+class ArchivedEquipmentReturn(Base):
+    __tablename__ = "Equipment_Returns_Archive"
+    return_id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, ForeignKey("Orders_Archive.order_id"), nullable=False)
+    equipment_id = Column(Integer, ForeignKey("Equipment.equipment_id"), nullable=False)
+    returned_by_user_id = Column(Integer, ForeignKey("Users.user_id"), nullable=False)
+    return_date = Column(DateTime)
+    condition_on_return = Column(Enum(EquipmentReturnCondition))
+    damage_description = Column(Text)
+    additional_charges = Column(DECIMAL(10, 2), default=0)
+    notes = Column(Text)
+
+    __table_args__ = (
+        Index("idx_returns_archive_order", "order_id"),
+    )
+
 class ConsumableTransactionType(enum.Enum):
     receipt = "receipt"
     consumption = "consumption"
     writeoff = "writeoff"
 
+class LoginHistory(Base):
+    __tablename__ = "Login_History"
+    history_id = Column(Integer, primary_key=True, index=True)
+    user_login = Column(String(50), nullable=False)
+    attempt_time = Column(DateTime)
+    is_successful = Column(Boolean, nullable=False)
+    ip_address = Column(String(45))
+    user_agent = Column(Text)
+    failure_reason = Column(String(255))
+
+    __table_args__ = (
+        Index("idx_login_history_time", "attempt_time"),
+        Index("idx_login_history_user", "user_login"),
+        Index("idx_login_history_success", "is_successful", "attempt_time"),
+    )
+
+class SessionManagement(Base):
+    __tablename__ = "Session_Management"
+    session_id = Column(String(255), primary_key=True)
+    user_id = Column(Integer, ForeignKey("Users.user_id"), nullable=False)
+    login_time = Column(DateTime)
+    last_activity = Column(DateTime)
+    session_duration_minutes = Column(Integer, default=150)
+    is_active = Column(Boolean, default=True)
+    logout_time = Column(DateTime)
+
+    __table_args__ = (
+        Index("idx_sessions_active", "is_active", "last_activity"),
+        Index("idx_sessions_user", "user_id"),
+    )
+
+    user = relationship("User")
+
 class Consumable(Base):
     __tablename__ = "Consumables"
     consumable_id = Column(Integer, primary_key=True, index=True)
@@ -187,5 +315,27 @@ class ConsumableTransaction(Base):
     document_number = Column(String(100))
     notes = Column(Text)
 
+    __table_args__ = (Index("idx_consumable_transactions_item", "consumable_id", "transaction_date"),)
+
     consumable = relationship("Consumable")
     user = relationship("User")
+
+class ReportCache(Base):
+    __tablename__ = "Reports_Cache"
+    cache_id = Column(Integer, primary_key=True, index=True)
+    report_type = Column(String(100), nullable=False)
+    parameters_hash = Column(String(255), nullable=False)
+    report_data = Column(Text)
+    file_path = Column(String(500))
+    generated_by_user_id = Column(Integer, ForeignKey("Users.user_id"), nullable=False)
+    generated_at = Column(DateTime)
+    expires_at = Column(DateTime)
+
+    __table_args__ = (Index("idx_reports_cache_key", "report_type", "parameters_hash"),)
+
+    generated_by_user = relationship("User")
+
+class SequenceCounter(Base):
+    __tablename__ = "Sequences"
+    sequence_name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
@@ -0,0 +1,86 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, and_, or_, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, value: Any, last_id: int) -> str:
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort, value, last_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(sort, str) or not isinstance(last_id, int):
+        raise InvalidCursor("Malformed cursor")
+    return sort, value, last_id
+
+
+def paginate(
+    stmt: Select,
+    pk: InstrumentedAttribute,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    sort_columns: Optional[Dict[str, InstrumentedAttribute]] = None,
+) -> Select:
+    """Order ``stmt`` by ``sort`` (then the primary key) and seek past ``cursor``.
+
+    The cursor carries the sort key and the last row's values, so every page is
+    an index range scan instead of an OFFSET that discards the earlier rows.
+    ``skip`` is still applied for clients that page by offset.
+    """
+    sort = sort or pk.key
+    sort_columns = sort_columns or {}
+    if sort != pk.key and sort not in sort_columns:
+        raise InvalidCursor(f"Unsupported sort key: {sort}")
+    column = sort_columns.get(sort)
+
+    if column is None:
+        stmt = stmt.order_by(pk)
+    else:
+        stmt = stmt.order_by(column, pk)
+
+    if cursor is not None:
+        cursor_sort, value, last_id = decode_cursor(cursor)
+        if cursor_sort != sort:
+            raise InvalidCursor("Cursor was issued for a different sort key")
+        if column is None:
+            stmt = stmt.where(pk > last_id)
+        elif value is None:
+            # MySQL and SQLite sort NULLs first ascending: finish the NULL run, then every set value.
+            stmt = stmt.where(or_(and_(column.is_(None), pk > last_id), column.is_not(None)))
+        else:
+            python_type = column.type.python_type
+            if issubclass(python_type, date):
+                try:
+                    value = python_type.fromisoformat(value)
+                except (TypeError, ValueError):
+                    raise InvalidCursor("Malformed cursor")
+            stmt = stmt.where(tuple_(column, pk) > tuple_(value, last_id))
+
+    return stmt.offset(skip).limit(limit)
+
+
+def next_cursor(rows: Sequence[Any], limit: int, pk: str, sort: Optional[str] = None) -> Optional[str]:
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    sort = sort or pk
+    return encode_cursor(sort, getattr(last, sort) if sort != pk else None, getattr(last, pk))
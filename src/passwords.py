@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from config import get_settings
+
+try:
+    import bcrypt
+except ImportError:  # only needed for legacy "$2y$" hashes
+    bcrypt = None
+
+SCHEME = "scrypt"
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=KEY_BYTES)
+    return f"{SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """Check ``password`` against ``stored``; return ``(matches, needs_rehash)``.
+
+    Besides our own scrypt hashes this accepts bcrypt hashes from the seed data
+    (when ``bcrypt`` is installed) and passwords stored before hashing existed.
+    Both of those are flagged for rehashing.
+    """
+    if stored.startswith(SCHEME + "$"):
+        try:
+            _, n, r, p, salt, key = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            expected = base64.b64decode(salt), base64.b64decode(key)
+        except ValueError:
+            return False, False
+        actual = hashlib.scrypt(password.encode(), salt=expected[0], n=n, r=r, p=p, dklen=len(expected[1]))
+        return hmac.compare_digest(actual, expected[1]), (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    if stored.startswith("$2"):
+        if bcrypt is None:
+            return False, False
+        # PHP writes "$2y$"; the bcrypt package only knows "$2b$", which is the same algorithm.
+        return bcrypt.checkpw(password.encode(), ("$2b$" + stored[4:]).encode()), True
+    return hmac.compare_digest(stored.encode(), password.encode()), True
+
+
+class PasswordHasher:
+    """Runs hashing on a small thread pool so it never blocks the event loop.
+
+    ``hashlib.scrypt`` and ``bcrypt`` release the GIL, so ``workers`` threads
+    hash in parallel. At most ``max_pending`` calls may wait or run at once;
+    beyond that ``PasswordHasherBusy`` is raised, so a login burst gets quick
+    503s instead of an ever-growing queue.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.calls = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        return await self._run(verify_password, password, stored)
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password checks in progress, try again shortly")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hasher")
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            result = fn(*args)
+            return started - submitted, time.perf_counter() - started, result
+
+        self.pending += 1
+        future = self._executor.submit(job)
+        # Released when the job finishes, even if the awaiting request was cancelled.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        queued, took, result = await asyncio.wrap_future(future)
+        self.calls += 1
+        self.queue_seconds_total += queued
+        self.queue_seconds_max = max(self.queue_seconds_max, queued)
+        self.run_seconds_total += took
+        return result
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "queue_seconds_total": self.queue_seconds_total,
+            "queue_seconds_max": self.queue_seconds_max,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+hasher = PasswordHasher(get_settings().password_hash_workers, get_settings().password_hash_max_pending)
+
+# Verified against when the login is unknown, so both cases take the same time.
+DUMMY_HASH = f"{SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(bytes(SALT_BYTES))}${_b64(bytes(KEY_BYTES))}"
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class ReloadableIndex:
+    """Base for in-memory indexes rebuilt from the database every ``refresh_seconds``.
+
+    Subclasses list their data attributes in ``STATE`` and implement
+    ``_reset`` (empty state) and ``_load(data)`` (fill it from what the loader
+    returned). A rebuild runs in a worker thread on a blank instance and is
+    swapped in when done, so the live index keeps answering in the meantime.
+    Writes made through this worker go through ``_record``: applied to the live
+    index at once, and replayed on the new one if a rebuild is in flight.
+    """
+
+    STATE: Tuple[str, ...] = ()
+
+    def __init__(self, refresh_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._loading = False
+        self._journal: List[Tuple[str, tuple]] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        raise NotImplementedError
+
+    def _load(self, data: Any) -> None:
+        raise NotImplementedError
+
+    @property
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or self.clock() - self.loaded_at > self.refresh_seconds
+
+    def _record(self, operation: str, args: tuple) -> None:
+        if self._loading:
+            self._journal.append((operation, args))
+        if self.loaded_at is not None:
+            getattr(self, "_" + operation)(*args)
+
+    def _build(self, data: Any) -> Dict[str, Any]:
+        fresh = object.__new__(type(self))
+        fresh._reset()
+        fresh._load(data)
+        return {name: getattr(fresh, name) for name in self.STATE}
+
+    def _install(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        # Every replayed operation is idempotent, so changes the snapshot already has are harmless.
+        for operation, args in self._journal:
+            getattr(self, "_" + operation)(*args)
+        self._journal = []
+        self.loaded_at = self.clock()
+
+    def replace(self, data: Any) -> None:
+        """Rebuild from ``data`` synchronously (tools and benchmarks)."""
+        self._install(self._build(data))
+
+    async def ensure_fresh(self, loader: Callable[[], Awaitable[Any]]) -> None:
+        """Reload from ``loader()`` when stale; the rebuild itself runs off the event loop."""
+        if not self.is_stale:
+            return
+        async with self._lock:
+            if not self.is_stale:
+                return
+            self._loading = True
+            self._journal = []
+            try:
+                data = await loader()
+                state = await asyncio.to_thread(self._build, data)
+                self._install(state)
+            finally:
+                self._loading = False
+                self._journal = []
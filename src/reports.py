@@ -0,0 +1,259 @@
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import and_, distinct, func, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+import models
+from config import get_settings
+from singleflight import SingleFlight
+
+DAILY_STATISTICS = "daily_statistics"
+POPULAR_SERVICES = "popular_services"
+
+# Past this many touched days a full recompute is as cheap as patching.
+MAX_INCREMENTAL_DAYS = 31
+# (orders, order lines): reports read the hot tables and the archive alike, so
+# archiving an order never changes a report it is in.
+ORDER_TABLES = (
+    (models.Order, models.OrderService),
+    (models.ArchivedOrder, models.ArchivedOrderService),
+)
+
+_flights = SingleFlight()
+
+
+class UnknownReportsUser(LookupError):
+    def __init__(self, user_id: int):
+        super().__init__(
+            f"IGORA_REPORTS_USER_ID={user_id} is not an existing user; "
+            "log in to request reports or set it to an existing user id"
+        )
+        self.user_id = user_id
+
+
+def parameters_hash(report_type: str, parameters: Dict[str, Any]) -> str:
+    payload = json.dumps({"report_type": report_type, **parameters}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _day_key(value) -> str:
+    return value.isoformat() if isinstance(value, date) else str(value)[:10]
+
+
+def _day_filter(order, days: Set[str]):
+    order_date = order.order_date
+    return or_(*(
+        and_(order_date >= datetime.fromisoformat(day), order_date < datetime.fromisoformat(day) + timedelta(days=1))
+        for day in sorted(days)
+    ))
+
+
+def _range_filter(order, date_from: date, date_to: date):
+    return and_(
+        order.order_date >= datetime.combine(date_from, datetime.min.time()),
+        order.order_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()),
+        order.status != models.OrderStatus.cancelled,
+    )
+
+
+def _in_range(build, date_from: date, date_to: date, days: Optional[Set[str]]):
+    """UNION ALL of ``build(order, line)`` over the hot and archive tables, each branch filtered on its own index."""
+    branches = []
+    for order, line in ORDER_TABLES:
+        stmt = build(order, line).where(_range_filter(order, date_from, date_to))
+        if days is not None:
+            stmt = stmt.where(_day_filter(order, days))
+        branches.append(stmt)
+    return union_all(*branches).subquery()
+
+
+async def _daily_statistics_days(db: AsyncSession, date_from: date, date_to: date, days: Optional[Set[str]]):
+    orders = _in_range(
+        lambda order, line: select(order.order_date, order.total_amount, order.client_id), date_from, date_to, days
+    )
+    day = func.date(orders.c.order_date)
+    stmt = select(
+        day.label("order_day"),
+        func.count().label("orders_count"),
+        func.coalesce(func.sum(orders.c.total_amount), 0).label("daily_revenue"),
+        func.count(distinct(orders.c.client_id)).label("unique_clients"),
+    ).group_by(day)
+    result = await db.execute(stmt)
+    return {
+        _day_key(row.order_day): {
+            "orders_count": row.orders_count,
+            "daily_revenue": float(row.daily_revenue),
+            "unique_clients": row.unique_clients,
+        }
+        for row in result
+    }
+
+
+async def _popular_services_days(db: AsyncSession, date_from: date, date_to: date, days: Optional[Set[str]]):
+    lines = _in_range(
+        lambda order, line: select(
+            order.order_date, line.service_id, line.order_service_id, line.total_price, line.unit_price
+        ).join(line, line.order_id == order.order_id),
+        date_from, date_to, days,
+    )
+    day = func.date(lines.c.order_date)
+    stmt = (
+        select(
+            day.label("order_day"),
+            models.Service.service_id,
+            models.Service.service_name,
+            func.count(lines.c.order_service_id).label("booking_count"),
+            func.sum(lines.c.total_price).label("total_revenue"),
+            func.sum(lines.c.unit_price).label("unit_price_sum"),
+        )
+        .join(models.Service, models.Service.service_id == lines.c.service_id)
+        .group_by(day, models.Service.service_id, models.Service.service_name)
+    )
+    result = await db.execute(stmt)
+    per_day: Dict[str, list] = {}
+    for row in result:
+        per_day.setdefault(_day_key(row.order_day), []).append({
+            "service_id": row.service_id,
+            "service_name": row.service_name,
+            "booking_count": row.booking_count,
+            "total_revenue": float(row.total_revenue or 0),
+            "unit_price_sum": float(row.unit_price_sum or 0),
+        })
+    return per_day
+
+
+def _daily_statistics_rows(days: Dict[str, dict]) -> List[dict]:
+    return [{"order_day": day, **values} for day, values in sorted(days.items())]
+
+
+def _popular_services_rows(days: Dict[str, list]) -> List[dict]:
+    totals: Dict[int, dict] = {}
+    for entries in days.values():
+        for entry in entries:
+            total = totals.setdefault(entry["service_id"], {
+                "service_id": entry["service_id"],
+                "service_name": entry["service_name"],
+                "booking_count": 0,
+                "total_revenue": 0.0,
+                "unit_price_sum": 0.0,
+            })
+            total["booking_count"] += entry["booking_count"]
+            total["total_revenue"] += entry["total_revenue"]
+            total["unit_price_sum"] += entry["unit_price_sum"]
+    rows = []
+    for total in totals.values():
+        unit_price_sum = total.pop("unit_price_sum")
+        total["avg_price"] = round(unit_price_sum / total["booking_count"], 2) if total["booking_count"] else 0.0
+        total["total_revenue"] = round(total["total_revenue"], 2)
+        rows.append(total)
+    rows.sort(key=lambda row: (-row["booking_count"], row["service_id"]))
+    return rows
+
+
+REPORTS: Dict[str, tuple] = {
+    DAILY_STATISTICS: (_daily_statistics_days, _daily_statistics_rows),
+    POPULAR_SERVICES: (_popular_services_days, _popular_services_rows),
+}
+
+
+async def _watermarks(db: AsyncSession) -> Dict[str, int]:
+    orders = await db.execute(select(func.max(models.Order.order_id)))
+    lines = await db.execute(select(func.max(models.OrderService.order_service_id)))
+    return {"order_id": orders.scalar() or 0, "order_service_id": lines.scalar() or 0}
+
+
+async def _touched_days(db: AsyncSession, watermarks: Dict[str, int], date_from: date, date_to: date) -> Set[str]:
+    """Days in range that gained orders or order lines since ``watermarks``.
+
+    Both checks are primary-key range scans. Status changes to older orders are
+    not seen here; they are picked up when the entry expires. Archiving keeps
+    ids and report values, so it touches nothing.
+    """
+    day = func.date(models.Order.order_date)
+    new_orders = select(day).where(models.Order.order_id > watermarks.get("order_id", 0))
+    new_lines = (
+        select(day)
+        .join(models.OrderService, models.OrderService.order_id == models.Order.order_id)
+        .where(models.OrderService.order_service_id > watermarks.get("order_service_id", 0))
+    )
+    touched = set()
+    for stmt in (new_orders, new_lines):
+        result = await db.execute(stmt.where(_range_filter(models.Order, date_from, date_to)).distinct())
+        touched.update(_day_key(value) for value in result.scalars() if value is not None)
+    return touched
+
+
+async def _generated_by(db: AsyncSession, user_id: Optional[int]) -> int:
+    # Reports_Cache.generated_by_user_id is a NOT NULL foreign key to Users.
+    if user_id is not None:
+        return user_id
+    fallback = get_settings().reports_user_id
+    if await db.get(models.User, fallback) is None:
+        raise UnknownReportsUser(fallback)
+    return fallback
+
+
+async def _refresh(report_type: str, date_from: date, date_to: date, user_id: Optional[int]) -> List[dict]:
+    compute_days, build_rows = REPORTS[report_type]
+    settings = get_settings()
+    key = parameters_hash(report_type, {"date_from": date_from, "date_to": date_to})
+    now = datetime.now()
+
+    async with database.async_session() as db:
+        result = await db.execute(
+            select(models.ReportCache)
+            .where(models.ReportCache.report_type == report_type, models.ReportCache.parameters_hash == key)
+            .order_by(models.ReportCache.cache_id.desc())
+            .limit(1)
+        )
+        entry = result.scalars().first()
+        watermarks = await _watermarks(db)
+
+        data = None
+        if entry is not None and entry.report_data and entry.expires_at is not None and entry.expires_at > now:
+            data = json.loads(entry.report_data)
+            touched = await _touched_days(db, data["watermarks"], date_from, date_to)
+            if len(touched) > MAX_INCREMENTAL_DAYS:
+                data = None
+            elif touched:
+                fresh = await compute_days(db, date_from, date_to, touched)
+                for day in touched:
+                    data["days"].pop(day, None)
+                data["days"].update(fresh)
+                data["watermarks"] = watermarks
+                entry.report_data = json.dumps(data)
+                entry.generated_at = now
+                await db.commit()
+            else:
+                return build_rows(data["days"])
+
+        if data is None:
+            data = {"watermarks": watermarks, "days": await compute_days(db, date_from, date_to, None)}
+            if entry is None:
+                entry = models.ReportCache(
+                    report_type=report_type,
+                    parameters_hash=key,
+                    generated_by_user_id=await _generated_by(db, user_id),
+                )
+                db.add(entry)
+            entry.report_data = json.dumps(data)
+            entry.generated_at = now
+            entry.expires_at = now + timedelta(seconds=settings.reports_ttl_seconds)
+            await db.commit()
+
+    return build_rows(data["days"])
+
+
+async def get_report(report_type: str, date_from: date, date_to: date, user_id: Optional[int] = None) -> List[dict]:
+    """Return a report, refreshing its ``Reports_Cache`` entry as needed.
+
+    A new entry is attributed to ``user_id`` (the caller), or to
+    ``IGORA_REPORTS_USER_ID`` for anonymous requests. Concurrent requests for
+    the same report and range share one refresh.
+    """
+    key = (report_type, date_from, date_to)
+    return await _flights.do(key, lambda: _refresh(report_type, date_from, date_to, user_id))
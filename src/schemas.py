@@ -1,6 +1,6 @@
 from typing import Optional, List
 from datetime import date, datetime
-from pydantic import BaseModel, EmailStr, constr
+from pydantic import BaseModel, ConfigDict, EmailStr, condecimal, conint, conlist, constr
 from enum import Enum
 
 class RoleBase(BaseModel):
@@ -14,8 +14,7 @@ class RoleCreate(RoleBase):
 class Role(RoleBase):
     role_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserBase(BaseModel):
     login: str
@@ -34,8 +33,7 @@ class User(UserBase):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ClientBase(BaseModel):
     client_code: constr(max_length=20)
@@ -57,8 +55,7 @@ class Client(ClientBase):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class EquipmentCategoryBase(BaseModel):
     category_name: str
@@ -71,8 +68,7 @@ class EquipmentCategoryCreate(EquipmentCategoryBase):
 class EquipmentCategory(EquipmentCategoryBase):
     category_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class EquipmentConditionStatus(str, Enum):
     excellent = "excellent"
@@ -98,8 +94,7 @@ class EquipmentCreate(EquipmentBase):
 class Equipment(EquipmentBase):
     equipment_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ServiceBase(BaseModel):
     service_name: str
@@ -118,8 +113,7 @@ class Service(ServiceBase):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class OrderStatus(str, Enum):
     active = "active"
@@ -128,7 +122,7 @@ class OrderStatus(str, Enum):
     archived = "archived"
 
 class OrderBase(BaseModel):
-    order_number: str
+    order_number: Optional[str] = None
     client_id: int
     user_id: int
     start_date: datetime
@@ -143,12 +137,15 @@ class OrderCreate(OrderBase):
     pass
 
 class Order(OrderBase):
+    order_number: str
     order_id: int
     order_date: Optional[datetime]
     created_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus
 
 class OrderServiceBase(BaseModel):
     order_id: int
@@ -166,8 +163,53 @@ class OrderServiceCreate(OrderServiceBase):
 class OrderService(OrderServiceBase):
     order_service_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class LoginRequest(BaseModel):
+    login: str
+    password: str
+
+class SessionInfo(BaseModel):
+    session_id: str
+    user_id: int
+    expires_at: datetime
+
+class BulkItemError(BaseModel):
+    index: int
+    detail: str
+
+class BulkCreateResult(BaseModel):
+    ids: List[Optional[int]]
+    errors: List[BulkItemError] = []
+
+class OrderLineCreate(BaseModel):
+    service_id: int
+    equipment_id: Optional[int] = None
+    quantity: conint(gt=0) = 1
+    rental_hours: Optional[conint(gt=0)] = None
+    notes: Optional[str] = None
+
+class OrderFullCreate(BaseModel):
+    order_number: Optional[str] = None
+    client_id: int
+    user_id: int
+    start_date: datetime
+    end_date: datetime
+    barcode: Optional[str] = None
+    notes: Optional[str] = None
+    lines: conlist(OrderLineCreate, min_length=1)
+
+class OrderFull(Order):
+    lines: List[OrderService]
+
+class OrderLineDetail(OrderService):
+    service: Optional[Service] = None
+    equipment: Optional[Equipment] = None
+
+class OrderDetail(Order):
+    client: Optional[Client] = None
+    user: Optional[User] = None
+    lines: Optional[List[OrderLineDetail]] = None
 
 class EquipmentReturnCondition(str, Enum):
     excellent = "excellent"
@@ -191,8 +233,7 @@ class EquipmentReturn(EquipmentReturnBase):
     return_id: int
     return_date: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ConsumableBase(BaseModel):
     item_name: str
@@ -211,8 +252,7 @@ class Consumable(ConsumableBase):
     consumable_id: int
     last_updated: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ConsumableTransactionType(str, Enum):
     receipt = "receipt"
@@ -229,11 +269,29 @@ class ConsumableTransactionBase(BaseModel):
     notes: Optional[str] = None
 
 class ConsumableTransactionCreate(ConsumableTransactionBase):
-    pass
+    quantity: condecimal(gt=0, max_digits=10, decimal_places=2)
 
 class ConsumableTransaction(ConsumableTransactionBase):
     transaction_id: int
     transaction_date: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ScanResult(BaseModel):
+    kind: str
+    equipment: Optional[Equipment] = None
+    active_order: Optional[Order] = None
+    order: Optional[OrderDetail] = None
+
+class DailyStatistics(BaseModel):
+    order_day: date
+    orders_count: int
+    daily_revenue: float
+    unique_clients: int
+
+class PopularService(BaseModel):
+    service_id: int
+    service_name: str
+    booking_count: int
+    total_revenue: float
+    avg_price: float
@@ -0,0 +1,53 @@
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from config import get_settings
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+@lru_cache(maxsize=None)
+def adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def dump_json(model: type, value: Any, many: bool = False, exclude_unset: bool = False) -> bytes:
+    """Validate ``value`` (ORM rows or schema instances) once and encode it to JSON bytes.
+
+    Schema instances are not validated again, and encoding happens in
+    pydantic-core without building intermediate dicts.
+    """
+    target = list_adapter(model) if many else adapter(model)
+    return target.dump_json(target.validate_python(value, from_attributes=True), exclude_unset=exclude_unset)
+
+
+def render(
+    model: type,
+    value: Any,
+    response: Optional[Response] = None,
+    many: bool = False,
+    exclude_unset: bool = False,
+):
+    """Return ``value`` for FastAPI's response_model handling, or JSON bytes when fast_json is on.
+
+    In fast mode the route's response_model is skipped entirely, so headers set
+    on the injected ``response`` are copied over by hand.
+    """
+    if not get_settings().fast_json:
+        return value
+    fast = Response(dump_json(model, value, many, exclude_unset), media_type=JSON_MEDIA_TYPE)
+    if response is not None:
+        for name, header in response.headers.raw:
+            if name != b"content-length":
+                fast.raw_headers.append((name, header))
+        if response.status_code:
+            fast.status_code = response.status_code
+    return fast
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import secrets
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cache
+import crud
+import database
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = "igora_session"
+CACHE_NAMESPACE = "sessions"
+MAX_CACHED_SESSIONS = 10000
+# Reachable without a session even when IGORA_AUTH_REQUIRED is on.
+PUBLIC_PATHS = {"/", "/auth/login", "/metrics"}
+
+
+@dataclass
+class ActiveSession:
+    session_id: str
+    user_id: int
+    duration: timedelta
+    last_activity: datetime
+
+    @property
+    def expires_at(self) -> datetime:
+        return self.last_activity + self.duration
+
+
+class SessionStore:
+    """Validates sessions from memory and writes ``last_activity`` in batches.
+
+    Sessions live in the ``sessions`` namespace of ``cache`` for
+    ``IGORA_SESSION_CACHE_SECONDS``, so each one is re-read from
+    ``Session_Management`` at most that often. Logging out drops the session
+    from this worker at once; other workers stop accepting it when their copy
+    expires, i.e. at most ``IGORA_SESSION_CACHE_SECONDS`` later. Activity is
+    recorded in memory and written by ``flush``: one row update per session
+    per flush, however many requests it made.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, datetime] = {}
+        self.flushes = 0
+        self.rows_written = 0
+        self.revocations = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _entries() -> cache.TTLCache:
+        return cache.get_cache(CACHE_NAMESPACE, ttl=get_settings().session_cache_seconds, maxsize=MAX_CACHED_SESSIONS)
+
+    async def create(self, db: AsyncSession, user_id: int) -> ActiveSession:
+        duration = get_settings().session_duration_minutes
+        row = await crud.create_user_session(db, secrets.token_urlsafe(32), user_id, duration)
+        session = ActiveSession(row.session_id, user_id, timedelta(minutes=duration), row.last_activity)
+        self._entries().set(session.session_id, session)
+        return session
+
+    async def validate(self, session_id: str) -> Optional[ActiveSession]:
+        """Return the live session for ``session_id`` and slide its expiry, or ``None``."""
+        now = datetime.now()
+        entries = self._entries()
+        session = entries.get(session_id)
+        if session is None:
+            revocations = self.revocations
+            async with database.async_session() as db:
+                row = await crud.get_user_session(db, session_id)
+            if row is None:
+                return None
+            last_activity = row.last_activity or row.login_time or now
+            session = ActiveSession(
+                row.session_id,
+                row.user_id,
+                timedelta(minutes=row.session_duration_minutes or get_settings().session_duration_minutes),
+                max(last_activity, self.pending.get(session_id, last_activity)),
+            )
+            # A logout that raced this read must not be masked by caching the old row.
+            if self.revocations == revocations:
+                entries.set(session_id, session)
+        if now > session.expires_at:
+            entries.pop(session_id)
+            self.pending.pop(session_id, None)
+            return None
+        session.last_activity = now
+        self.pending[session_id] = now
+        return session
+
+    async def revoke(self, db: AsyncSession, session_id: str) -> None:
+        self.pending.pop(session_id, None)
+        await crud.close_user_session(db, session_id)
+        self.revocations += 1
+        self._entries().pop(session_id)
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            async with database.async_session() as db:
+                await crud.touch_user_sessions(db, batch)
+        except BaseException:
+            for session_id, at in batch.items():
+                if self.pending.get(session_id, at) <= at:
+                    self.pending[session_id] = at
+            raise
+        self.flushes += 1
+        self.rows_written += len(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending_writes": len(self.pending), "flushes": self.flushes, "rows_written": self.rows_written}
+
+    def start(self, interval: float) -> None:
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write session activity; retrying on the next flush")
+
+
+store = SessionStore()
+
+
+def session_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return token.strip()
+    return request.cookies.get(SESSION_COOKIE)
+
+
+async def authenticate(request: Request) -> Optional[ActiveSession]:
+    """App-wide dependency: validate the caller's session, if any.
+
+    Requests without a session pass through unless ``IGORA_AUTH_REQUIRED`` is
+    on; a session that is unknown, revoked or expired is always rejected.
+    """
+    if request.url.path in PUBLIC_PATHS:
+        return None
+    token = session_token(request)
+    if token is None:
+        if get_settings().auth_required:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    session = await store.validate(token)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Session expired or revoked", headers={"WWW-Authenticate": "Bearer"})
+    request.state.session = session
+    return session
+
+
+async def current_session(session: Optional[ActiveSession] = Depends(authenticate)) -> ActiveSession:
+    if session is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return session
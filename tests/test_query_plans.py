@@ -0,0 +1,24 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+import models
+from bench.explain import CASES, compile_sql, full_scans
+
+
+@pytest.fixture(scope="module")
+def connection(tmp_path_factory):
+    path = tmp_path_factory.mktemp("plans") / "igora.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+    connection = sqlite3.connect(path)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize("name, table, build", CASES, ids=[case[0] for case in CASES])
+def test_filter_is_served_by_an_index(connection, name, table, build):
+    plan = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + compile_sql(build()))]
+    assert not full_scans(plan, table), plan
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine
+
+pytest.importorskip("aiosqlite")
+
+import models
+from config import get_settings
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    for path in (primary, replica):
+        engine = create_engine(f"sqlite:///{path}")
+        models.Base.metadata.create_all(engine)
+        engine.dispose()
+    monkeypatch.setenv("IGORA_DATABASE_URL", f"sqlite+aiosqlite:///{primary}")
+    monkeypatch.setenv("IGORA_REPLICA_DATABASE_URL", f"sqlite+aiosqlite:///{replica}")
+    monkeypatch.setenv("IGORA_DB_PREWARM", "1")
+    get_settings.cache_clear()
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+    get_settings.cache_clear()
+
+
+def client_codes(response):
+    assert response.status_code == 200
+    return [client["client_code"] for client in response.json()]
+
+
+def test_reads_go_to_the_replica_unless_the_primary_is_asked_for(client):
+    created = client.post("/clients/", json={"client_code": "C1", "last_name": "Иванов", "first_name": "Иван"})
+    assert created.status_code == 200
+
+    # The write's cookie keeps this client on the primary for its own reads.
+    assert client_codes(client.get("/clients/")) == ["C1"]
+
+    client.cookies.clear()
+    assert client_codes(client.get("/clients/")) == []
+    assert client_codes(client.get("/clients/", headers={"X-Read-Primary": "1"})) == ["C1"]